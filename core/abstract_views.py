@@ -4,6 +4,8 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils.decorators import method_decorator
 from django.views.generic.base import View
 
+from core.tenancy import tenant_admin_required
+
 
 @method_decorator(login_required, name='dispatch')
 class ProtectedView(View, metaclass=ABCMeta):
@@ -18,3 +20,10 @@ class SuperuserView(View, metaclass=ABCMeta):
     """Parent for all views that require a login."""
 
     ...
+
+
+@method_decorator(tenant_admin_required, name='dispatch')
+class TenantAdminView(View, metaclass=ABCMeta):
+    """Parent for all views that only the admins of the request's tenant may use."""
+
+    ...
@@ -0,0 +1,301 @@
+"""Per-request timing of SQL, TMDB calls and template rendering, aggregated into histograms across workers."""
+from __future__ import annotations
+import bisect
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES = (1000, 5000, 20000, 50000, 100000, 250000, 1000000)
+
+# Sums are added up in the cache as integers, in millionths
+SUM_SCALE = 1000000
+# Cache key of the number of view labels ever registered, each of which has an index
+VIEWS_KEY = 'metrics:views'
+
+_VIEW_INDEXES: dict[str, int] = {}
+
+
+def add_to(key: str, delta: int) -> None:
+    """Add to a counter in the shared cache, creating it if needed."""
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, delta, None)
+
+
+def view_index(view: str) -> int:
+    """
+    Return the index of a view label in the shared cache, registering it if it is new.
+
+    Indexes are allocated with an atomic increment and claimed with add, so
+    workers registering the same view at once agree on one index without a
+    lock; an index that loses the race is left unnamed and skipped.
+    """
+    index = _VIEW_INDEXES.get(view)
+    if index is not None:
+        return index
+
+    key = 'metrics:view:' + hashlib.sha1(view.encode()).hexdigest()
+    index = cache.get(key)
+    if index is None:
+        cache.add(VIEWS_KEY, 0, None)
+        candidate = cache.incr(VIEWS_KEY)
+        cache.add(key, candidate, None)
+        index = cache.get(key, candidate)
+        if index == candidate:
+            cache.set(f'metrics:view-name:{index}', view, None)
+    _VIEW_INDEXES[view] = index
+    return index
+
+
+def registered_views() -> dict[int, str]:
+    """Return every view label registered by any worker, keyed by index."""
+    count = cache.get(VIEWS_KEY, 0)
+    names = cache.get_many([f'metrics:view-name:{index}' for index in range(1, count + 1)])
+    return {int(key.rsplit(':', 1)[1]): view for key, view in names.items()}
+
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram with a `view` label.
+
+    Each worker collects observations in memory and flush() adds them to
+    counters in the shared cache, which exposition() reads, so a scrape
+    sees the requests of every worker rather than just the one serving it.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...]) -> None:
+        """Create a histogram with the given metric name, help text and bucket upper bounds."""
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # For each view, since the last flush: a count per bucket (plus +Inf), the sum and the total count
+        self._series: dict[str, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view: str, value: float) -> None:
+        """Record a value for a view."""
+        with self._lock:
+            counts, totals = self._series.setdefault(view, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def flush(self) -> None:
+        """Add the observations made since the last flush to the shared counters."""
+        with self._lock:
+            series, self._series = self._series, {}
+
+        for view, (counts, (total, count)) in series.items():
+            prefix = f'metrics:{self.name}:{view_index(view)}'
+            for bucket, bucket_count in enumerate(counts):
+                if bucket_count:
+                    add_to(f'{prefix}:{bucket}', bucket_count)
+            add_to(f'{prefix}:sum', round(total * SUM_SCALE))
+            add_to(f'{prefix}:count', int(count))
+
+    def exposition(self, views: dict[int, str]) -> list[str]:
+        """Return the histogram's lines in the Prometheus text format, as flushed by every worker."""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        fields = [str(bucket) for bucket in range(len(self.buckets) + 1)] + ['sum', 'count']
+        values = cache.get_many([f'metrics:{self.name}:{index}:{field}' for index in views for field in fields])
+
+        series = {}
+        for index, view in views.items():
+            count = values.get(f'metrics:{self.name}:{index}:count')
+            if count is None:
+                continue
+            series[view] = (
+                [values.get(f'metrics:{self.name}:{index}:{bucket}', 0) for bucket in range(len(self.buckets) + 1)],
+                (values.get(f'metrics:{self.name}:{index}:sum', 0) / SUM_SCALE, count),
+            )
+
+        for view, (counts, (total, count)) in sorted(series.items()):
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {total:g}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('philmnight_request_duration_seconds', 'Time to produce a response.', SECONDS)
+SQL_QUERIES = Histogram('philmnight_sql_queries', 'SQL queries made per request.', COUNTS)
+SQL_SECONDS = Histogram('philmnight_sql_duration_seconds', 'Time spent in SQL queries per request.', SECONDS)
+TMDB_REQUESTS = Histogram('philmnight_tmdb_requests', 'TMDB requests made per request.', COUNTS)
+TMDB_SECONDS = Histogram('philmnight_tmdb_duration_seconds', 'Time spent waiting on TMDB per request.', SECONDS)
+TEMPLATE_SECONDS = Histogram('philmnight_template_render_seconds', 'Time spent rendering templates per request.',
+                             SECONDS)
+RESPONSE_BYTES = Histogram('philmnight_response_size_bytes', 'Size of response bodies.', BYTES)
+
+HISTOGRAMS = (REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, TMDB_REQUESTS, TMDB_SECONDS, TEMPLATE_SECONDS,
+              RESPONSE_BYTES)
+
+
+class RequestMetrics:
+    """Totals for the request being handled."""
+
+    def __init__(self) -> None:
+        """Start every total at zero."""
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.tmdb_requests = 0
+        self.tmdb_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar(
+    'request_metrics', default=None
+)
+
+
+def record_tmdb(seconds: float) -> None:
+    """Count a TMDB request against the current request, if there is one."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.tmdb_requests += 1
+        metrics.tmdb_seconds += seconds
+
+
+_last_flush = time.monotonic()
+_flush_lock = threading.Lock()
+
+
+def flush(force: bool = False) -> None:
+    """Flush every histogram, unless this worker did so less than settings.METRICS_FLUSH_INTERVAL seconds ago."""
+    global _last_flush  # pylint: disable=global-statement
+    with _flush_lock:
+        if not force and time.monotonic() - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        _last_flush = time.monotonic()
+        # The cache was cleared, so indexes remembered here may since have gone to other views
+        if cache.get(VIEWS_KEY, 0) < max(_VIEW_INDEXES.values(), default=0):
+            _VIEW_INDEXES.clear()
+    for histogram in HISTOGRAMS:
+        histogram.flush()
+
+
+def exposition() -> str:
+    """Return every histogram in the Prometheus text format, with this worker's latest observations included."""
+    flush(force=True)
+    views = registered_views()
+    return '\n'.join(line for histogram in HISTOGRAMS for line in histogram.exposition(views)) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Record where each request spends its time.
+
+    Histograms are labelled with the matched URL route. Each worker flushes
+    them to the shared cache at most every METRICS_FLUSH_INTERVAL seconds,
+    so the cache backend must be shared for one scrape to cover every
+    worker, and restarting it resets the counters. Requests slower than
+    SLOW_REQUEST_THRESHOLD seconds are logged with their breakdown.
+    Streamed responses are timed until their headers are ready.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        """Wrap the next middleware or view."""
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        """Handle a request, recording its timings and sizes."""
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self.time_query(metrics)):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = '/' + match.route if match is not None else 'unmatched'
+        REQUEST_SECONDS.observe(view, elapsed)
+        SQL_QUERIES.observe(view, metrics.sql_queries)
+        SQL_SECONDS.observe(view, metrics.sql_seconds)
+        TMDB_REQUESTS.observe(view, metrics.tmdb_requests)
+        TMDB_SECONDS.observe(view, metrics.tmdb_seconds)
+        TEMPLATE_SECONDS.observe(view, metrics.template_seconds)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(view, len(response.content))
+        flush()
+
+        if elapsed > settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                'Slow request: %s %s took %.3fs (%d queries in %.3fs, %d TMDB requests in %.3fs, '
+                'templates %.3fs)', request.method, request.path, elapsed, metrics.sql_queries,
+                metrics.sql_seconds, metrics.tmdb_requests, metrics.tmdb_seconds, metrics.template_seconds
+            )
+        return response
+
+    @staticmethod
+    def time_query(metrics: RequestMetrics) -> Callable[..., Any]:
+        """Return a database execute wrapper that adds each query to `metrics`."""
+        def wrapper(execute: Callable[..., Any], sql: str, params: Any, many: bool, context: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                metrics.sql_queries += 1
+                metrics.sql_seconds += time.perf_counter() - started
+        return wrapper
+
+
+class TimedTemplate:
+    """A template that adds its rendering time to the current request."""
+
+    def __init__(self, template: Any) -> None:
+        """Wrap a template of the Django backend."""
+        self.template = template
+
+    def __getattr__(self, name: str) -> Any:
+        """Return any other attribute of the wrapped template."""
+        return getattr(self.template, name)
+
+    def render(self, context: Optional[dict[str, Any]] = None, request: Optional[HttpRequest] = None) -> str:
+        """Render the template, timing it if a request is being measured."""
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend that times rendering.
+
+    Only templates loaded through the backend are wrapped, i.e. those a view
+    renders; included and extended templates count towards them.
+    """
+
+    def from_string(self, template_code: str) -> TimedTemplate:
+        """Compile a template from a string, timing its rendering."""
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name: str) -> TimedTemplate:
+        """Load a template by name, timing its rendering."""
+        return TimedTemplate(super().get_template(template_name))
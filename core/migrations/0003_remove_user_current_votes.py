@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 14:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20211019_2250'),
+        ('film_management', '0005_vote'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='current_votes',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='last_vote',
+        ),
+    ]
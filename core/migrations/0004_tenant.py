@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+# core.models.DEFAULT_TENANT_SLUG when this migration was written
+DEFAULT_TENANT_SLUG = 'default'
+
+
+def create_default_tenant(apps, schema_editor):
+    """Create the tenant that existing data is moved to and unmatched requests are served by."""
+    Tenant = apps.get_model('core', 'Tenant')
+    Tenant.objects.get_or_create(slug=DEFAULT_TENANT_SLUG)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_remove_user_current_votes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('domain', models.CharField(blank=True, max_length=253, null=True, unique=True,
+                                            help_text='Host name that serves this tenant without a path prefix')),
+            ],
+            options={
+                'ordering': ['slug'],
+            },
+        ),
+        migrations.RunPython(create_default_tenant, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 15:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='admins',
+            field=models.ManyToManyField(blank=True, help_text="Users who can change this group's config and films", related_name='administered_tenants', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,23 +1,61 @@
 """Core models for Philmnight."""
-import datetime
-from typing import Any
+from typing import Iterable, Iterator, Union
 
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, AnonymousUser
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.urls import URLResolver, get_resolver
+
+# The tenant that existing data was moved to, and that requests matching no other tenant are served by
+DEFAULT_TENANT_SLUG = 'default'
 
 
 class User(AbstractUser):
     """Override the default django user model."""
 
-    current_votes = models.TextField(blank=True, default='')
-    last_vote = models.DateTimeField(default=datetime.datetime.min)
 
-    def save(self, *args: Any, **kwargs: Any) -> None:
-        """Override default save method in order to clean up votes."""
-        current_votes = self.current_votes.split(',')
-        for item in current_votes:
-            if item == '':
-                current_votes.remove(item)
+def route_prefixes(patterns: Iterable[object]) -> Iterator[str]:
+    """Yield the first path segment of each URL pattern, looking inside includes at the root."""
+    for pattern in patterns:
+        prefix = str(getattr(pattern, 'pattern', '')).split('/')[0]
+        if prefix:
+            yield prefix
+        elif isinstance(pattern, URLResolver):
+            yield from route_prefixes(pattern.url_patterns)
+
+
+class Tenant(models.Model):
+    """
+    A group hosted by this deployment, with its own config, watchlist and filmnights.
+
+    Requests are served for the tenant whose domain matches the host, or
+    whose slug is the first segment of the path, e.g. /film-soc/films/.
+    Users are shared, so one account can take part in several groups, but
+    only the tenant's admins can change its config and films. Superusers
+    run the deployment and can manage every tenant.
+    """
+
+    slug = models.SlugField(max_length=50, unique=True)
+    domain = models.CharField(max_length=253, unique=True, blank=True, null=True,
+                              help_text='Host name that serves this tenant without a path prefix')
+    admins = models.ManyToManyField(User, blank=True, related_name='administered_tenants',
+                                    help_text='Users who can change this group\'s config and films')
+
+    class Meta:
+        ordering = ['slug']
+
+    def __str__(self) -> str:
+        """Return a string representation of the tenant."""
+        return self.slug
+
+    def is_admin(self, user: Union[User, AnonymousUser]) -> bool:
+        """Return whether a user may manage this tenant, without a query if its admins were prefetched."""
+        if not user.is_authenticated:
+            return False
+        return user.is_superuser or any(admin.pk == user.pk for admin in self.admins.all())
 
-        self.current_votes = ','.join(current_votes)
-        super().save(*args, **kwargs)
+    def clean(self) -> None:
+        """Reject slugs that would hide one of the site's own paths, and store domains in lower case."""
+        if self.slug in set(route_prefixes(get_resolver().url_patterns)):
+            raise ValidationError({'slug': f'/{self.slug}/ is already used by the site'})
+        self.domain = self.domain.lower() if self.domain else None
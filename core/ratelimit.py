@@ -0,0 +1,120 @@
+"""Per-user request rate limits kept in the cache with sliding logs and sliding-window counters."""
+import functools
+import math
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+# Limits of up to this many requests per window are enforced exactly, with one cache key per request
+SLIDING_LOG_LIMIT = 10
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """Return the number of requests and window in seconds of a rate written as e.g. '30/60'."""
+    count, seconds = rate.split('/')
+    return int(count), int(seconds)
+
+
+def client_key(request: HttpRequest) -> str:
+    """Identify the client making a request: the user if logged in, otherwise the address."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def hit(name: str, client: str, limit: int, window: int) -> Optional[int]:
+    """
+    Count a request against a limit. Return None if it is allowed, else seconds until one would be.
+
+    Limits of up to SLIDING_LOG_LIMIT requests are kept exactly, larger ones
+    approximately with two counters. Rejected requests are not counted, so
+    retrying after Retry-After succeeds.
+    """
+    if limit <= SLIDING_LOG_LIMIT:
+        return hit_log(name, client, limit, window)
+    return hit_counters(name, client, limit, window)
+
+
+def hit_log(name: str, client: str, limit: int, window: int) -> Optional[int]:
+    """
+    Count a request against a limit with an exact sliding log.
+
+    The log has one slot per request allowed, each a cache key that holds
+    the time of the request that took it and expires a window later. Slots
+    are taken with add, so concurrent requests never share one.
+    """
+    now = time.time()
+    keys = [f'ratelimit:{name}:{client}:slot:{slot}' for slot in range(limit)]
+    taken = cache.get_many(keys)
+    for key in keys:
+        if key not in taken and cache.add(key, now, window):
+            return None
+
+    # Every slot was taken; the oldest is the first to free up
+    taken = cache.get_many(keys)
+    return max(math.ceil(min(taken.values(), default=now - window) + window - now), 1)
+
+
+def hit_counters(name: str, client: str, limit: int, window: int) -> Optional[int]:
+    """
+    Count a request against a limit with sliding-window counters.
+
+    The counts of the current and previous fixed windows are kept, and the
+    previous one is weighted by how much of it is still inside the sliding
+    window. That approximates a true sliding window with two cache keys per
+    client, however many requests it makes, and is close enough once the
+    limit is more than a few requests.
+    """
+    now = time.time()
+    index, offset = divmod(now, window)
+    current_key = f'ratelimit:{name}:{client}:{int(index)}'
+    previous = cache.get(f'ratelimit:{name}:{client}:{int(index) - 1}', 0)
+
+    cache.add(current_key, 0, window * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(current_key, 1, window * 2)
+        current = 1
+
+    weight = 1 - offset / window
+    if previous * weight + current <= limit:
+        return None
+    cache.decr(current_key)
+
+    # Find when the sliding window will have room for one more request
+    current -= 1
+    if current >= limit:
+        # Wait for the next window, then for enough of this one to slide out
+        retry = window - offset + window * (1 - (limit - 1) / current)
+    else:
+        retry = window * (1 - (limit - current - 1) / previous) - offset
+    return max(math.ceil(retry), 1)
+
+
+def rate_limit(name: str) -> Callable[[Callable[..., HttpResponse]], Callable[..., HttpResponse]]:
+    """
+    Limit how often each client may call a view, to the rate in settings.RATE_LIMITS[name].
+
+    Requests over the limit get a 429 response with a Retry-After header.
+    """
+    def decorator(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+        @functools.wraps(view)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+            limit, window = parse_rate(settings.RATE_LIMITS[name])
+            retry_after = hit(name, client_key(request), limit, window)
+            if retry_after is None:
+                return view(request, *args, **kwargs)
+
+            response = JsonResponse({
+                'success': False,
+                'message': f'You\'re doing that too fast. Try again in {retry_after} seconds',
+            }, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,29 @@
+"""Signal handlers configuring database connections and keeping tenant lookups current."""
+from typing import Any
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Tenant
+from .tenancy import bump_tenants_version
+
+
+@receiver(connection_created)
+def configure_sqlite(connection: BaseDatabaseWrapper, **kwargs: Any) -> None:
+    """Apply SQLITE_PRAGMAS to new SQLite connections."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+@receiver(m2m_changed, sender=Tenant.admins.through)
+def invalidate_tenants(**kwargs: Any) -> None:
+    """Make workers reload the tenants when one or its admins change, e.g. in the admin."""
+    bump_tenants_version()
@@ -0,0 +1,119 @@
+"""Resolving which tenant each request is for."""
+import functools
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.management.base import CommandError
+from django.db.models import Prefetch
+from django.http import Http404, HttpRequest, HttpResponse
+from django.http.request import split_domain_port
+from django.urls import get_script_prefix, set_script_prefix
+
+from core.models import Tenant, User
+from film_management.models import bump_cache_version, cache_version
+
+# Cache key of a token that changes whenever any tenant is written
+TENANTS_VERSION_KEY = 'tenants:version'
+
+_TENANTS: tuple[Optional[str], dict[str, Tenant], dict[str, Tenant]] = (None, {}, {})
+
+
+def get_tenants() -> tuple[dict[str, Tenant], dict[str, Tenant]]:
+    """
+    Return every tenant keyed by domain and by slug.
+
+    Like the config, they are kept in-process and only reloaded, with their
+    admins, once their version in the shared cache changes.
+    """
+    global _TENANTS  # pylint: disable=global-statement
+    version = cache_version(TENANTS_VERSION_KEY)
+    cached_version, by_domain, by_slug = _TENANTS
+    if cached_version != version:
+        tenants = list(Tenant.objects.prefetch_related(Prefetch('admins', queryset=User.objects.only('id'))))
+        by_domain = {tenant.domain: tenant for tenant in tenants if tenant.domain}
+        by_slug = {tenant.slug: tenant for tenant in tenants}
+        _TENANTS = (version, by_domain, by_slug)
+    return by_domain, by_slug
+
+
+def bump_tenants_version() -> None:
+    """Make every worker reload the tenants."""
+    bump_cache_version(TENANTS_VERSION_KEY)
+
+
+def resolve_tenant(host: str, path: str) -> tuple[Optional[Tenant], str]:
+    """
+    Return the tenant a request is for and the path prefix that selected it, if any.
+
+    A tenant whose domain is the host comes first, then one whose slug is
+    the first segment of the path, then settings.DEFAULT_TENANT.
+    """
+    by_domain, by_slug = get_tenants()
+    tenant = by_domain.get(host.lower())
+    if tenant is not None:
+        return tenant, ''
+
+    slug = path.lstrip('/').split('/')[0]
+    if slug in by_slug:
+        return by_slug[slug], '/' + slug
+    return by_slug.get(settings.DEFAULT_TENANT), ''
+
+
+def tenant_from_option(slug: Optional[str]) -> Tenant:
+    """Return the tenant given to a management command's --tenant option, by default settings.DEFAULT_TENANT."""
+    slug = slug or settings.DEFAULT_TENANT
+    try:
+        return Tenant.objects.get(slug=slug)
+    except Tenant.DoesNotExist as e:
+        raise CommandError(f'No tenant has the slug {slug}') from e
+
+
+class TenantMiddleware:
+    """
+    Set request.tenant, serving tenants selected by path as if they were mounted there.
+
+    The slug is moved from the path to the script prefix, so the URLconf
+    matches the rest of the path and reversed URLs keep the slug.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        """Wrap the next middleware or view."""
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        """Resolve the request's tenant, or 404 if no tenant is hosted at its domain and path."""
+        tenant, prefix = resolve_tenant(split_domain_port(request.get_host())[0], request.path_info)
+        if tenant is None:
+            raise Http404('No group is hosted here')
+
+        if prefix:
+            request.path_info = request.path_info[len(prefix):] or '/'
+            set_script_prefix(get_script_prefix() + prefix.lstrip('/'))
+        request.tenant = tenant
+        return self.get_response(request)
+
+
+def tenant_admin_required(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+    """Only let the admins of the request's tenant use a view, sending anyone else to log in."""
+    @functools.wraps(view)
+    def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        if not request.tenant.is_admin(request.user):
+            return redirect_to_login(request.get_full_path())
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def tenant(request: HttpRequest) -> dict[str, object]:
+    """
+    Template context processor adding the tenant and who may administer it.
+
+    Adds the tenant, whether the user is one of its admins, and the prefix
+    that links to its pages start with.
+    """
+    current = getattr(request, 'tenant', None)
+    return {
+        'tenant': current,
+        'tenant_admin': current is not None and current.is_admin(request.user),
+        'script_prefix': get_script_prefix(),
+    }
@@ -1,3 +1,1365 @@
-from django.test import TestCase
+"""Tests for Philmnight."""
+import datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Optional
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.templatetags.static import static
+from django.test.utils import CaptureQueriesContext
+
+from core import metrics
+from core.ratelimit import hit
+from core.models import DEFAULT_TENANT_SLUG, Tenant, User
+from film_management import tmdb
+from film_management.models import (
+    CatalogueEntry, CatalogueWord, Film, FilmConfig, Filmnight, Genre, SubmissionJob, Vote
+)
+from film_management.management.commands.import_catalogue import Command as ImportCatalogueCommand
+from film_management.management.commands.import_films import Command as ImportFilmsCommand
+from film_management.management.commands.refresh_films import Command as RefreshFilmsCommand
+from film_management.forms import FilmConfigForm
+from film_management.images import FILM_IMAGES, cache_film_images, derivative_path
+from film_management.pagination import InvalidCursor, paginate
+from film_management.search import SEARCH_CACHE, SearchCache, find_films, search_catalogue
+from film_management.shortlist import close_filmnight, draw_shortlist, sample_shortlist
+from film_management.tally import VoteTally
+from film_management.templatetags.philmnight_tags import film_backdrop, film_poster
+from film_management.views import get_config
+
+
+class TMDBStub:
+    """Minimal local TMDB server serving canned films and images."""
+
+    def __init__(self, films: Optional[dict[int, dict[str, Any]]] = None,
+                 images: Optional[dict[str, bytes]] = None) -> None:
+        self.films = films or {}
+        # Image content by file name, served at every size
+        self.images = images or {}
+        self.requests: list[str] = []
+        self.failures = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                url = urlparse(self.path)
+                stub.requests.append(url.path)
+                if stub.failures:
+                    stub.failures -= 1
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                parts = url.path.strip('/').split('/')
+                if parts[:2] == ['search', 'movie']:
+                    query = parse_qs(url.query)['query'][0].lower()
+                    results = [film for film in stub.films.values() if query in film['title'].lower()]
+                    self.send_json({'results': results, 'total_results': len(results)})
+                elif parts[0] == 'movie' and int(parts[1]) in stub.films:
+                    etag = f'"{parts[1]}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                    else:
+                        self.send_json(stub.films[int(parts[1])], etag)
+                elif parts[0] == 't' and parts[-1] in stub.images:
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(stub.images[parts[-1]])))
+                    self.end_headers()
+                    self.wfile.write(stub.images[parts[-1]])
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+
+            def send_json(self, data: Any, etag: Optional[str] = None) -> None:
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self, **kwargs: Any) -> tmdb.TMDBClient:
+        """Return a TMDB client pointed at this stub."""
+        kwargs.setdefault('backoff', 0)
+        kwargs.setdefault('image_endpoint', f'http://127.0.0.1:{self.server.server_port}/t/p/')
+        return tmdb.TMDBClient(f'http://127.0.0.1:{self.server.server_port}/', 'key', **kwargs)
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def stub_film(tmdb_id: int, title: str, release_date: str = '2000-01-01') -> dict[str, Any]:
+    """Return a TMDB movie payload."""
+    return {
+        'id': tmdb_id, 'title': title, 'release_date': release_date, 'vote_average': 7.5,
+        'overview': '', 'tagline': '', 'poster_path': f'/{tmdb_id}.jpg', 'backdrop_path': '',
+        'genres': [{'id': 18, 'name': 'Drama'}], 'popularity': 1.0,
+    }
+
+
+def use_temporary_media(test: SimpleTestCase) -> None:
+    """Store media in a temporary directory for the rest of a test, starting with the shipped logo."""
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    os.mkdir(os.path.join(media.name, 'logo'))
+    shutil.copy(os.path.join(settings.BASE_DIR, 'media', 'logo', 'logo.png'), os.path.join(media.name, 'logo'))
+    media_root = override_settings(MEDIA_ROOT=media.name)
+    media_root.enable()
+    test.addCleanup(media_root.disable)
+
+
+def default_tenant() -> Tenant:
+    """Return the default tenant, which flushing the database after a TransactionTestCase removes."""
+    return Tenant.objects.get_or_create(slug=DEFAULT_TENANT_SLUG)[0]
+
+
+def create_config(**kwargs) -> FilmConfig:
+    """Create a tenant's film config without running its image processing."""
+    fields = {
+        'tenant': default_tenant(),
+        'next_filmnight': datetime.datetime.now() + datetime.timedelta(hours=12),
+        'filmnight_timedelta': datetime.timedelta(days=7),
+        'voting_length': datetime.timedelta(days=1),
+    }
+    fields.update(kwargs)
+    FilmConfig.objects.bulk_create([FilmConfig(**fields)])
+    FilmConfig.bump_version(fields['tenant'].id)
+    return FilmConfig.objects.get(tenant=fields['tenant'])
+
+
+def create_filmnight(**kwargs) -> Filmnight:
+    """Create a filmnight that is open for voting, with its shortlist drawn but empty."""
+    now = datetime.datetime.now()
+    fields = {
+        'voting_opens': now - datetime.timedelta(hours=12),
+        'starts': now + datetime.timedelta(hours=12),
+        'ends': now + datetime.timedelta(hours=36),
+        'shortlist_drawn': now - datetime.timedelta(hours=12),
+    }
+    fields.update(kwargs)
+    fields.setdefault('tenant', default_tenant())
+    return Filmnight.objects.create(**fields)
+
+
+def create_films(count: int, start: int = 1, tenant: Optional[Tenant] = None) -> list[Film]:
+    """Create films directly, bypassing the TMDB lookup in Film.save."""
+    tenant = tenant or default_tenant()
+    Film.objects.bulk_create([
+        Film(tenant=tenant, tmdb_id=tmdb_id, name=f'Film {tmdb_id}') for tmdb_id in range(start, start + count)
+    ])
+    return list(Film.objects.filter(tenant=tenant, tmdb_id__gte=start, tmdb_id__lt=start + count))
+
+
+class VoteTallyTests(TestCase):
+    """Check the incremental vote tally against a full recount."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.filmnight = create_filmnight()
+        self.filmnight.shortlist.set(create_films(8))
+        self.users = [User.objects.create(username=f'user{i}') for i in range(10)]
+
+    def recount(self) -> dict[int, int]:
+        return dict(self.filmnight.shortlist.with_votes(self.filmnight).values_list(
+            'tmdb_id', 'vote_count'
+        ))
+
+    def test_tally_matches_recount(self) -> None:
+        rng = random.Random(0)
+        tmdb_ids = [str(film.tmdb_id) for film in self.filmnight.shortlist.all()]
+        tally = VoteTally(self.filmnight)
+
+        for _ in range(50):
+            self.client.force_login(rng.choice(self.users))
+            votes = rng.sample(tmdb_ids, rng.randint(0, 4))
+            response = self.client.post('/film_management/submit_votes/', json.dumps(votes),
+                                        content_type='text/plain')
+            self.assertTrue(response.json()['success'])
+            self.assertEqual(tally.counts(), self.recount())
+
+        counts = self.recount()
+        self.assertEqual(counts[tally.leader()], max(counts.values()))
+
+    def test_leader_needs_votes(self) -> None:
+        tally = VoteTally(self.filmnight)
+        self.assertIsNone(tally.leader())
+        self.client.force_login(self.users[0])
+        self.client.post('/film_management/submit_votes/', json.dumps(['3']), content_type='text/plain')
+        self.assertEqual(tally.leader(), 3)
+
+    def test_tally_rebuilds_after_eviction(self) -> None:
+        self.client.force_login(self.users[0])
+        self.client.post('/film_management/submit_votes/', json.dumps(['1', '2']),
+                         content_type='text/plain')
+        cache.clear()
+        self.client.post('/film_management/submit_votes/', json.dumps(['2', '3']),
+                         content_type='text/plain')
+        self.assertEqual(VoteTally(self.filmnight).counts(), self.recount())
+
+    def test_rejects_films_outside_shortlist(self) -> None:
+        self.client.force_login(self.users[0])
+        create_films(1, start=100)
+        response = self.client.post('/film_management/submit_votes/', json.dumps(['100']),
+                                    content_type='text/plain')
+        self.assertFalse(response.json()['success'])
+
+    def vote(self, votes: Any) -> dict[str, Any]:
+        """Submit votes as JSON and return the decoded response."""
+        return self.client.post('/film_management/submit_votes/', votes,
+                                content_type='application/json').json()
+
+    def test_delta_votes_query_counts(self) -> None:
+        self.client.force_login(self.users[0])
+        self.vote({})
+
+        # Session, user, current votes and one write
+        with self.assertNumQueries(4):
+            response = self.vote({'add': [1, 2, 3]})
+        self.assertEqual(response['votes'], [1, 2, 3])
+
+        with self.assertNumQueries(4):
+            response = self.vote({'remove': [2]})
+        self.assertEqual(response['votes'], [1, 3])
+
+        # Nothing to write
+        with self.assertNumQueries(3):
+            response = self.vote({'add': [1], 'remove': [4]})
+        self.assertEqual(response['votes'], [1, 3])
+
+        # A full set replacing some votes needs both a delete and an insert
+        with self.assertNumQueries(5):
+            response = self.vote([3, 4])
+        self.assertEqual(response['votes'], [3, 4])
+        self.assertEqual(response['tallies'], {str(tmdb_id): count for tmdb_id, count in self.recount().items()})
+
+    def test_votes_for_films_off_the_shortlist(self) -> None:
+        self.client.force_login(self.users[0])
+        self.vote([1])
+        dropped = create_films(1, start=100)[0]
+        Vote.objects.create(user=self.users[0], film=dropped, filmnight=self.filmnight)
+
+        response = self.vote([2])
+        self.assertEqual(response['votes'], [2])
+        self.assertEqual(list(Vote.objects.values_list('film__tmdb_id', flat=True)), [2])
+        self.assertEqual(VoteTally(self.filmnight).counts(), self.recount())
+
+    def test_tallies_are_revalidated(self) -> None:
+        self.client.force_login(self.users[0])
+        self.vote([1])
+        response = self.client.get('/film_management/tallies/')
+        self.assertEqual(response.json()['1'], 1)
+        etag = response['ETag']
+
+        # Only the session and user are loaded while nobody votes
+        with self.assertNumQueries(2):
+            response = self.client.get('/film_management/tallies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+        self.vote([1, 2])
+        response = self.client.get('/film_management/tallies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['2'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+        Filmnight.objects.filter(pk=self.filmnight.pk).update(voting_opens=self.filmnight.starts)
+        Filmnight.bump_version(self.filmnight.tenant_id)
+        self.assertEqual(self.client.get('/film_management/tallies/').status_code, 204)
+
+    def test_shortlist_is_checked_without_queries(self) -> None:
+        self.client.force_login(self.users[0])
+        self.vote({})
+        create_films(1, start=100)
+
+        with self.assertNumQueries(2):
+            self.assertFalse(self.vote({'add': [1, 100]})['success'])
+        for body in ({'add': 1}, {'add': [None]}, ['x'], 'not json'):
+            self.assertFalse(self.vote(body)['success'])
+        self.assertEqual(Vote.objects.count(), 0)
+
+
+class ConcurrentVoteTests(TransactionTestCase):
+    """Check that a user's simultaneous submissions leave the tally equal to a recount."""
+
+    def test_duplicate_submissions_are_counted_once(self) -> None:
+        cache.clear()
+        filmnight = create_filmnight()
+        filmnight.shortlist.set(create_films(8))
+        user = User.objects.create(username='voter')
+        clients = [Client() for _ in range(6)]
+        for client in clients:
+            client.force_login(user)
+        barrier = threading.Barrier(len(clients))
+
+        def vote(client: Client) -> None:
+            try:
+                barrier.wait()
+                client.post('/film_management/submit_votes/', json.dumps({'add': [1, 2]}),
+                            content_type='application/json')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vote, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(VoteTally(filmnight).counts(), dict(
+            filmnight.shortlist.with_votes(filmnight).values_list('tmdb_id', 'vote_count')
+        ))
+
+
+class TMDBClientTests(TestCase):
+    """Exercise the TMDB client against a local stub server."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.stub = TMDBStub({550: stub_film(550, 'Fight Club')})
+        self.addCleanup(self.stub.close)
+        self.addCleanup(tmdb.set_client, None)
+
+    def test_movie_is_cached_then_revalidated(self) -> None:
+        client = self.stub.client(cache_ttl=60)
+        self.assertEqual(client.movie(550)['title'], 'Fight Club')
+        self.assertEqual(client.movie(550)['title'], 'Fight Club')
+        self.assertEqual(len(self.stub.requests), 1)
+
+        client.cache_ttl = 0
+        self.assertEqual(client.movie(550)['title'], 'Fight Club')
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_errors(self) -> None:
+        client = self.stub.client(retries=2)
+        with self.assertRaises(tmdb.FilmNotFound):
+            client.movie(1)
+
+        self.stub.failures = 2
+        self.assertEqual(len(client.search('fight')), 1)
+
+        self.stub.failures = 3
+        with self.assertRaises(tmdb.TMDBError):
+            client.search('fight')
+
+    def test_film_save_uses_client(self) -> None:
+        tmdb.set_client(self.stub.client())
+        film = Film.objects.create(tenant=default_tenant(), tmdb_id=550)
+        self.assertEqual(film.name, 'Fight Club')
+        self.assertEqual([genre.name for genre in film.genres.all()], ['Drama'])
+
+
+class RateLimitTests(TestCase):
+    """Check that rate limits reject requests over them until the window has moved on."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        # Both the limiter and the cache's expiry read the clock
+        self.now = 6000.0
+        patcher = mock.patch('time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_small_limit_is_exact(self) -> None:
+        self.client.force_login(User.objects.create(username='submitter'))
+        with self.settings(RATE_LIMITS=dict(settings.RATE_LIMITS, submit_film='1/10')):
+            self.assertEqual(self.client.post('/film_management/submit_film/1').status_code, 200)
+            self.now += 4
+            response = self.client.post('/film_management/submit_film/2')
+            self.assertEqual((response.status_code, response['Retry-After']), (429, '6'))
+            self.assertFalse(response.json()['success'])
+
+            # Allowed as soon as the first request leaves the window
+            self.now += 6
+            self.assertEqual(self.client.post('/film_management/submit_film/2').status_code, 200)
+        self.assertEqual(SubmissionJob.objects.count(), 2)
+
+    def test_large_limit_rolls_over(self) -> None:
+        for _ in range(20):
+            self.assertIsNone(hit('search', 'user:1', 20, 60))
+        retry = hit('search', 'user:1', 20, 60)
+        self.assertEqual(retry, 63)
+        # Another client has its own limit
+        self.assertIsNone(hit('search', 'user:2', 20, 60))
+
+        self.now += retry - 1
+        self.assertIsNotNone(hit('search', 'user:1', 20, 60))
+        self.now += 1
+        self.assertIsNone(hit('search', 'user:1', 20, 60))
+        self.now += 120
+        for _ in range(20):
+            self.assertIsNone(hit('search', 'user:1', 20, 60))
+
+
+class SearchCacheTests(SimpleTestCase):
+    """Check prefix reuse and eviction of cached search results."""
+
+    RESULTS = [{'id': 1, 'title': 'Alien'}, {'id': 2, 'title': 'Aliens'}, {'id': 3, 'title': 'Alien 3'}]
+
+    def test_complete_prefix_results_are_filtered(self) -> None:
+        search_cache = SearchCache()
+        search_cache.put('ali', self.RESULTS, True)
+        self.assertEqual([result['id'] for result in search_cache.get('aliens') or []], [2])
+        self.assertEqual([result['id'] for result in search_cache.get('alien 3') or []], [3])
+
+        # Incomplete results may be missing longer matches, so they are not reused
+        search_cache.put('pre', self.RESULTS, False)
+        self.assertIsNone(search_cache.get('pred'))
+
+    def test_expired_and_least_recently_used_entries_are_evicted(self) -> None:
+        search_cache = SearchCache(max_size=2, ttl=60)
+        with mock.patch('film_management.search.time.monotonic', return_value=1000):
+            search_cache.put('a', self.RESULTS, True)
+            search_cache.put('b', self.RESULTS, False)
+            search_cache.get('a')
+            search_cache.put('c', self.RESULTS, False)
+            self.assertIsNone(search_cache.get('b'))
+            self.assertIsNotNone(search_cache.get('a'))
+
+        with mock.patch('film_management.search.time.monotonic', return_value=1061):
+            self.assertIsNone(search_cache.get('a'))
+            self.assertIsNone(search_cache.get('c'))
+
+
+class CatalogueSearchTests(TestCase):
+    """Check that catalogue searches match the start of any word through indexes, and are cached."""
+
+    def setUp(self) -> None:
+        SEARCH_CACHE.clear()
+        now = datetime.datetime.now()
+        ImportCatalogueCommand.write_batch([
+            CatalogueEntry(tmdb_id=tmdb_id, title=title, search_title=title.lower(), popularity=popularity,
+                           imported=now)
+            for tmdb_id, title, popularity in [(155, 'The Dark Knight', 9), (49026, 'The Dark Knight Rises', 8),
+                                               (272, 'Batman Begins', 7), (1, 'Darkman', 1)]
+        ])
+
+    def test_word_prefixes(self) -> None:
+        tenant_id = default_tenant().id
+        self.assertEqual([film[1] for film in find_films('dark', tenant_id)], [1, 155, 49026])
+        self.assertEqual([film[1] for film in find_films('knight ri', tenant_id)], [49026])
+        # Shorter queries only match the start of titles, and nothing matches inside a word
+        self.assertEqual(search_catalogue('kn'), [])
+        self.assertEqual(search_catalogue('tman'), [])
+
+        # Complete results are reused for longer queries, leaving only the watchlist check
+        with self.assertNumQueries(1):
+            self.assertEqual([film[1] for film in find_films('dark kni', tenant_id)], [155, 49026])
+
+        if connection.vendor == 'sqlite':
+            sql, params = CatalogueWord.objects.filter(
+                suffix__gte='dark', suffix__lt='dark\uffff'
+            ).order_by('-popularity').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                self.assertIn('catalogue_word_suffix_idx', ' '.join(str(row) for row in cursor.fetchall()))
+
+
+class PaginationTests(TestCase):
+    """Check that walking every page of the watchlist returns each film once, in order."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        films = create_films(23)
+        rng = random.Random(4)
+        for film in films:
+            # Few distinct values, so pages break inside runs of ties and of NULLs
+            film.score = rng.choice([None, None, Decimal('5.0'), Decimal('7.5'), Decimal('9.1')])
+            film.date_submitted = datetime.datetime(2020, 1, 1) + datetime.timedelta(days=rng.randrange(4))
+        Film.objects.bulk_update(films, ['score', 'date_submitted'])
+
+    def walk(self, sort: str, size: int) -> list[int]:
+        """Return the ids of every film, following cursors from the first page to the last."""
+        ids, cursor = [], None
+        while True:
+            page, cursor = paginate(Film.objects.all(), sort, cursor, size)
+            self.assertLessEqual(len(page), size)
+            ids += [film.id for film in page]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_film_once(self) -> None:
+        films = list(Film.objects.all())
+        # NULL scores come first ascending and last descending; ties are broken by id in the sort direction
+        expected = {
+            'score': sorted(films, key=lambda film: (film.score is not None, film.score or 0, film.id)),
+            '-score': sorted(films, key=lambda film: (film.score is None, -(film.score or 0), -film.id)),
+            'date_submitted': sorted(films, key=lambda film: (film.date_submitted, film.id)),
+            '-date_submitted': sorted(films, key=lambda film: (film.date_submitted, film.id), reverse=True),
+            'name': sorted(films, key=lambda film: (film.name, film.id)),
+        }
+        for sort, ordered in expected.items():
+            for size in (1, 4, 7, 23, 30):
+                with self.subTest(sort=sort, size=size):
+                    self.assertEqual(self.walk(sort, size), [film.id for film in ordered])
+
+    def test_invalid_cursor(self) -> None:
+        for cursor in ('not base64!', 'WyJ4IiwgMV0', 'WzFd'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginate(Film.objects.all(), '-score', cursor, 5)
+
+
+class ImportFilmsTests(TestCase):
+    """Check that import_films adds new films and reports each one it skipped, by reason."""
+
+    def test_skipped_films_are_reported(self) -> None:
+        broken = stub_film(4, 'Broken')
+        del broken['release_date']
+        self.stub = TMDBStub({
+            1: stub_film(1, 'Present'), 2: stub_film(2, 'New'), 3: stub_film(3, 'Unreleased', '2999-01-01'),
+            4: broken,
+        })
+        self.addCleanup(self.stub.close)
+        tmdb.set_client(self.stub.client())
+        self.addCleanup(tmdb.set_client, None)
+        create_films(1)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as ids:
+            ids.write('1\n2  # a comment\n3\n4\n5\n2\n')
+            ids.flush()
+            output = StringIO()
+            call_command('import_films', ids.name, stdout=output)
+
+        self.assertEqual(output.getvalue().splitlines(), [
+            'Imported 1 films',
+            'Skipped 1 already present: 1',
+            'Skipped 1 unreleased: 3',
+            'Skipped 1 not found: 5',
+            'Skipped 1 failed: 4',
+        ])
+        self.assertEqual(sorted(Film.objects.values_list('tmdb_id', flat=True)), [1, 2])
+        self.assertEqual([genre.name for genre in Film.objects.get(tmdb_id=2).genres.all()], ['Drama'])
+        # Images are only downloaded for films that pass the release check
+        self.assertEqual([path for path in self.stub.requests if path.startswith('/t/p/')], ['/t/p/w500/2.jpg'])
+
+    def test_films_submitted_during_the_import_are_not_counted(self) -> None:
+        self.stub = TMDBStub({1: stub_film(1, 'Submitted'), 2: stub_film(2, 'New')})
+        self.addCleanup(self.stub.close)
+        tmdb.set_client(self.stub.client())
+        self.addCleanup(tmdb.set_client, None)
+
+        write_batch = ImportFilmsCommand.write_batch
+
+        def submit_first(batch: list[Film]) -> list[int]:
+            create_films(1)
+            return write_batch(batch)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as ids, \
+                mock.patch.object(ImportFilmsCommand, 'write_batch', staticmethod(submit_first)):
+            ids.write('1\n2\n')
+            ids.flush()
+            output = StringIO()
+            call_command('import_films', ids.name, stdout=output)
+
+        self.assertEqual(output.getvalue().splitlines(), ['Imported 1 films', 'Skipped 1 already present: 1'])
+        self.assertEqual(Film.objects.get(tmdb_id=1).name, 'Film 1')
+
+
+class SubmissionJobTests(TestCase):
+    """Check that every queued submission ends up done or failed, whatever goes wrong with it."""
+
+    def setUp(self) -> None:
+        create_config()
+        broken = stub_film(2, 'Broken')
+        del broken['genres']
+        self.stub = TMDBStub({1: stub_film(1, 'Undated', ''), 2: broken, 3: stub_film(3, 'Fine')})
+        self.addCleanup(self.stub.close)
+        tmdb.set_client(self.stub.client())
+        self.addCleanup(tmdb.set_client, None)
+        self.jobs = SubmissionJob.objects.bulk_create([
+            SubmissionJob(tenant=default_tenant(), tmdb_id=tmdb_id) for tmdb_id in (1, 2, 3)
+        ])
+        # The worker closes its connection between jobs, which would end the test's transaction
+        patcher = mock.patch('film_management.management.commands.run_film_worker.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_jobs_are_recorded(self) -> None:
+        with self.assertLogs('film_management.models', 'ERROR'):
+            call_command('run_film_worker', once=True, stdout=StringIO())
+
+        self.assertEqual(list(SubmissionJob.objects.order_by('tmdb_id').values_list('status', 'message')), [
+            (SubmissionJob.Status.FAILED, 'Film has not been released yet.'),
+            (SubmissionJob.Status.FAILED, 'Could not add the film.'),
+            (SubmissionJob.Status.DONE, 'Successfully added film'),
+        ])
+        self.assertEqual(list(Film.objects.values_list('tmdb_id', flat=True)), [3])
+
+    def test_worker_survives_a_failing_job(self) -> None:
+        output = StringIO()
+        # Recording the first job's outcome fails, as if the database went away
+        finish = mock.patch.object(SubmissionJob, 'finish', side_effect=[DatabaseError('disk I/O error'), None, None])
+        with finish, self.assertLogs(level='ERROR') as logs:
+            call_command('run_film_worker', once=True, stdout=output)
+
+        self.assertIn('Worker could not process job', logs.output[0])
+        self.assertEqual(len(output.getvalue().splitlines()), 2)
+        self.assertFalse(SubmissionJob.objects.filter(status=SubmissionJob.Status.PENDING).exists())
+
+
+def rotate_in_process(filmnight_id: int, last_id: int, barrier: Any, results: Any) -> None:
+    """Draw, close and claim queued jobs from a forked worker process, reporting what it won."""
+    try:
+        filmnight, last = Filmnight.objects.get(pk=filmnight_id), Filmnight.objects.get(pk=last_id)
+        barrier.wait()
+        drawn, winner = draw_shortlist(filmnight), close_filmnight(last)
+        jobs = []
+        while (job := SubmissionJob.claim()) is not None:
+            jobs.append(job.pk)
+        results.put((drawn, winner.pk if winner else None, jobs))
+    finally:
+        connection.close()
+
+
+class LogoTests(TestCase):
+    """Check that a changed logo is queued for run_film_worker, and that a missing one falls back to the static logo."""
+
+    def setUp(self) -> None:
+        use_temporary_media(self)
+        patcher = mock.patch('film_management.management.commands.run_film_worker.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_worker(self) -> str:
+        output = StringIO()
+        call_command('run_film_worker', once=True, stdout=output)
+        return output.getvalue()
+
+    def test_changed_logo_is_rendered_by_worker(self) -> None:
+        config = FilmConfig.objects.create(tenant=default_tenant())
+        self.assertEqual((config.logo.name, config.logo_hash, config.logo_pending), ('logo/logo.png', '', True))
+
+        self.assertIn('Rendered logo derivatives', self.run_worker())
+        config.refresh_from_db()
+        self.assertFalse(config.logo_pending)
+        self.assertTrue(default_storage.exists(derivative_path(config.logo_hash, 'favicon.png')))
+
+        # Saving without changing the logo queues nothing
+        config.name = 'Renamed'
+        config.save()
+        self.assertFalse(FilmConfig.objects.get().logo_pending)
+        self.assertEqual(self.run_worker(), '')
+
+    def test_missing_logo_falls_back_to_static(self) -> None:
+        config = FilmConfig.objects.create(tenant=default_tenant(), logo='logo/missing.png')
+        with self.assertLogs('film_management.models', 'WARNING'):
+            self.assertEqual(self.run_worker(), '')
+
+        config.refresh_from_db()
+        self.assertEqual((config.logo_hash, config.logo_pending), ('', False))
+        self.assertIsNone(config.logo_url('favicon.png'))
+        self.assertEqual(self.run_worker(), '')
+
+
+class FilmImageTests(TestCase):
+    """Check that film images are stored once per TMDB image, with a placeholder for any that could not be."""
+
+    def setUp(self) -> None:
+        use_temporary_media(self)
+        with open(os.path.join(settings.MEDIA_ROOT, 'logo', 'logo.png'), 'rb') as image:
+            data = image.read()
+        self.stub = TMDBStub(images={'poster.jpg': data, 'backdrop.jpg': data})
+        self.addCleanup(self.stub.close)
+        tmdb.set_client(self.stub.client())
+        self.addCleanup(tmdb.set_client, None)
+
+    def image_requests(self) -> list[str]:
+        return [path for path in self.stub.requests if path.startswith('/t/p/')]
+
+    def test_images_stored_once(self) -> None:
+        self.assertTrue(cache_film_images('/poster.jpg', '/backdrop.jpg'))
+        self.assertEqual(self.image_requests(), ['/t/p/w500/poster.jpg', '/t/p/w1280/backdrop.jpg'])
+
+        # Another film with the same images downloads nothing
+        self.assertTrue(cache_film_images('/poster.jpg', '/backdrop.jpg'))
+        self.assertEqual(len(self.image_requests()), 2)
+
+        film = Film(tmdb_id=1, poster_path='/poster.jpg', backdrop_path='/backdrop.jpg', images_cached=True)
+        for width in FILM_IMAGES['poster'][1]:
+            self.assertTrue(default_storage.exists(derivative_path('poster', f'poster-{width}.jpg')))
+            self.assertIn(film.poster_url(width), film_poster(film))
+        self.assertEqual(film_backdrop(film), film.backdrop_url())
+        self.assertTrue(film.backdrop_url().endswith('/derivatives/backdrop-backdrop-1280.jpg'))
+
+    def test_missing_images_fall_back(self) -> None:
+        self.assertFalse(cache_film_images('/missing.jpg', ''))
+        self.assertEqual(self.image_requests(), ['/t/p/w500/missing.jpg'])
+        self.assertFalse(default_storage.exists('derivatives'))
+
+        for film in (Film(tmdb_id=1, poster_path='/missing.jpg', images_cached=False),
+                     Film(tmdb_id=2, poster_path='', backdrop_path='', images_cached=True)):
+            self.assertIsNone(film.poster_url())
+            self.assertIsNone(film.backdrop_url())
+            self.assertIn(static('images/placeholder_film.png'), film_poster(film))
+            self.assertEqual(film_backdrop(film), '')
+
+
+class RefreshFilmsTests(TestCase):
+    """Check that refresh_films resumes where it stopped and only writes what changed."""
+
+    def setUp(self) -> None:
+        self.films = create_films(6)
+        self.stub = TMDBStub({film.tmdb_id: stub_film(film.tmdb_id, film.name) for film in self.films})
+        self.addCleanup(self.stub.close)
+        tmdb.set_client(self.stub.client())
+        self.addCleanup(tmdb.set_client, None)
+
+    def refresh(self, **options: Any) -> str:
+        output = StringIO()
+        call_command('refresh_films', workers=2, batch_size=2, stdout=output, **options)
+        return output.getvalue()
+
+    def fetched(self) -> list[int]:
+        """Return the TMDB ids of the films requested from the stub, and forget them."""
+        ids = sorted(int(path.split('/')[-1]) for path in self.stub.requests if path.startswith('/movie/'))
+        self.stub.requests.clear()
+        return ids
+
+    def test_interrupted_refresh_resumes(self) -> None:
+        refresh_batch = RefreshFilmsCommand.refresh_batch
+
+        def interrupt_second_batch(results: Any) -> dict[str, int]:
+            if refresh_batch_mock.call_count == 2:
+                raise KeyboardInterrupt
+            return refresh_batch(results)
+
+        with mock.patch.object(RefreshFilmsCommand, 'refresh_batch', side_effect=interrupt_second_batch) as \
+                refresh_batch_mock, self.assertRaises(KeyboardInterrupt):
+            self.refresh()
+        self.assertEqual(Film.objects.filter(refreshed_at__isnull=False).count(), 2)
+        self.fetched()
+
+        self.assertIn('Refreshed 4 of 4 films', self.refresh())
+        self.assertEqual(self.fetched(), [3, 4, 5, 6])
+        self.assertIn('Refreshed 0 of 0 films', self.refresh())
+
+    def test_only_changed_fields_are_written(self) -> None:
+        self.refresh()
+        self.fetched()
+        # Film 1 is renamed locally and loses its ETag, so only it gets a full response; the rest are 304s
+        Film.objects.filter(tmdb_id=1).update(name='Old name', tmdb_etag='')
+        Film.objects.update(refreshed_at=None)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn('Refreshed 6 of 6 films, 1 changed', self.refresh())
+        self.assertEqual(self.fetched(), [1, 2, 3, 4, 5, 6])
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "film_management_film"')]
+        written = [set(re.findall(r'(?:SET|,) "(\w+)" = ', sql)) for sql in updates]
+        self.assertEqual([fields for fields in written if fields != {'refreshed_at'}], [{'name', 'tmdb_etag'}])
+        self.assertEqual(Film.objects.get(tmdb_id=1).name, 'Film 1')
+
+
+class RotationTests(TransactionTestCase):
+    """Check that concurrent draws and closes of filmnights happen exactly once."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        now = datetime.datetime.now()
+        self.films = create_films(20)
+        self.last = create_filmnight(voting_opens=now - datetime.timedelta(days=8),
+                                     starts=now - datetime.timedelta(days=7),
+                                     ends=now - datetime.timedelta(days=6))
+        self.last.shortlist.set(self.films[:8])
+        self.filmnight = create_filmnight(shortlist_drawn=None)
+
+        users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        Vote.objects.bulk_create(
+            [Vote(user=user, film=self.films[0], filmnight=self.last) for user in users]
+            + [Vote(user=users[0], film=self.films[1], filmnight=self.last)]
+        )
+
+    def rotate_concurrently(self, workers: int) -> list[tuple[bool, Optional[Film]]]:
+        """Draw and close from several threads at once, each with its own database connection."""
+        barrier = threading.Barrier(workers)
+        results: list[tuple[bool, Optional[Film]]] = []
+
+        def rotate() -> None:
+            try:
+                filmnight, last = Filmnight.objects.get(pk=self.filmnight.pk), Filmnight.objects.get(pk=self.last.pk)
+                barrier.wait()
+                results.append((draw_shortlist(filmnight), close_filmnight(last)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=rotate) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_rotation_happens_once(self) -> None:
+        results = self.rotate_concurrently(6)
+        self.assertEqual(sorted(drawn for drawn, _ in results), [False] * 5 + [True])
+        self.assertEqual([winner for _, winner in results if winner is not None], [self.films[0]])
+
+        self.assertEqual(list(Film.objects.filter(watched=True)), [self.films[0]])
+        self.assertEqual(Filmnight.objects.get(pk=self.last.pk).winner, self.films[0])
+        filmnight = Filmnight.objects.get(pk=self.filmnight.pk)
+        self.assertEqual(filmnight.shortlist.count(), 8)
+        self.assertIsNotNone(filmnight.shortlist_drawn)
+
+    def test_rotation_across_processes_happens_once(self) -> None:
+        SubmissionJob.objects.bulk_create([
+            SubmissionJob(tenant=default_tenant(), tmdb_id=tmdb_id) for tmdb_id in range(100, 120)
+        ])
+        jobs = list(SubmissionJob.objects.order_by('id').values_list('id', flat=True))
+        workers = 4
+        context = multiprocessing.get_context('fork')
+        barrier, queue = context.Barrier(workers), context.Queue()
+        # Each forked worker must open its own connection to the test database
+        connection.close()
+        processes = [context.Process(target=rotate_in_process, args=(self.filmnight.pk, self.last.pk, barrier, queue))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        results = [queue.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+
+        self.assertEqual([process.exitcode for process in processes], [0] * workers)
+        self.assertEqual(sorted(drawn for drawn, _, _ in results), [False] * (workers - 1) + [True])
+        self.assertEqual([winner for _, winner, _ in results if winner is not None], [self.films[0].pk])
+        claimed = [job for _, _, jobs in results for job in jobs]
+        self.assertEqual(sorted(claimed), jobs)
+        self.assertEqual(Filmnight.objects.get(pk=self.filmnight.pk).shortlist.count(), 8)
+        self.assertEqual(list(Film.objects.filter(watched=True)), [self.films[0]])
+
+    def test_rotation_is_idempotent(self) -> None:
+        self.assertTrue(draw_shortlist(self.filmnight))
+        self.assertEqual(close_filmnight(self.last), self.films[0])
+        shortlist = set(self.filmnight.shortlist.values_list('id', flat=True))
+
+        self.assertFalse(draw_shortlist(Filmnight.objects.get(pk=self.filmnight.pk)))
+        self.assertIsNone(close_filmnight(Filmnight.objects.get(pk=self.last.pk)))
+        self.assertEqual(set(self.filmnight.shortlist.values_list('id', flat=True)), shortlist)
+        self.assertEqual(Film.objects.filter(watched=True).count(), 1)
+
+
+class ShortlistTests(TestCase):
+    """Check the shortlist draw's seed, genre filter and weighting, and sample_shortlist --apply."""
+
+    def setUp(self) -> None:
+        self.tenant = default_tenant()
+        self.films = create_films(10)
+
+    def test_seed_reproduces_draw(self) -> None:
+        draw = sample_shortlist(self.tenant.id, 5, seed=42)
+        self.assertEqual(len(set(draw)), 5)
+        self.assertEqual(sample_shortlist(self.tenant.id, 5, seed=42), draw)
+        self.assertEqual(sample_shortlist(self.tenant.id, 5, weight='score', seed=42),
+                         sample_shortlist(self.tenant.id, 5, weight='score', seed=42))
+
+    def test_genre_filter(self) -> None:
+        drama = Genre.objects.get_or_create(id=18, defaults={'name': 'Drama'})[0]
+        comedy = Genre.objects.get_or_create(id=35, defaults={'name': 'Comedy'})[0]
+        for film in self.films[:3]:
+            film.genres.add(drama)
+        self.films[2].genres.add(comedy)
+        self.films[3].genres.add(comedy)
+
+        self.assertEqual(sorted(sample_shortlist(self.tenant.id, 10, genres=[drama.id])),
+                         [film.id for film in self.films[:3]])
+        self.assertEqual(sorted(sample_shortlist(self.tenant.id, 10, weight='age', genres=[drama.id, comedy.id])),
+                         [film.id for film in self.films[:4]])
+
+    def test_weighted_draw_favours_higher_weights(self) -> None:
+        Film.objects.filter(tenant=self.tenant).update(score=0)
+        favourite = self.films[0]
+        Film.objects.filter(id=favourite.id).update(score=9)
+
+        # The favourite weighs 10 against 1 for each of the other nine, so it is drawn about half the time
+        wins = sum(sample_shortlist(self.tenant.id, 1, weight='score', seed=seed) == [favourite.id]
+                   for seed in range(1000))
+        self.assertGreater(wins, 400)
+        self.assertLess(wins, 600)
+
+    def test_apply_replaces_current_shortlist(self) -> None:
+        cache.clear()
+        filmnight = create_filmnight(shortlist_length=3)
+        filmnight.shortlist.set(self.films[:3])
+        VoteTally(filmnight).rebuild()
+        expected = sample_shortlist(self.tenant.id, 3, seed=7)
+
+        output = StringIO()
+        call_command('sample_shortlist', seed=7, apply=True, stdout=output)
+
+        self.assertEqual(set(filmnight.shortlist.values_list('id', flat=True)), set(expected))
+        self.assertIn('Shortlist replaced with 3 films', output.getvalue())
+        # The cached tally follows the new shortlist rather than the old one
+        self.assertEqual(set(VoteTally(filmnight).shortlist().values()), set(expected))
+
+
+class FilmnightTests(TestCase):
+    """Check how the current filmnight is found and scheduled."""
+
+    def test_current_filmnight_ignores_history(self) -> None:
+        now = datetime.datetime.now()
+        week = datetime.timedelta(days=7)
+        tenant = default_tenant()
+        filmnights = Filmnight.objects.filter(tenant=tenant)
+        Filmnight.objects.bulk_create([
+            Filmnight(tenant=tenant, voting_opens=now - weeks * week - datetime.timedelta(days=1),
+                      starts=now - weeks * week, ends=now - weeks * week + datetime.timedelta(days=1), closed=True)
+            for weeks in range(1, 5 * 52)
+        ])
+        one_off = create_filmnight(name='One-off', starts=now + datetime.timedelta(days=2),
+                                   ends=now + datetime.timedelta(days=3))
+        weekly = create_filmnight(starts=now + datetime.timedelta(days=4), ends=now + datetime.timedelta(days=5))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(filmnights.current(now), one_off)
+        self.assertEqual(filmnights.current(now + datetime.timedelta(days=3)), weekly)
+        self.assertIsNone(filmnights.current(now + datetime.timedelta(days=5)))
+
+        if connection.vendor == 'sqlite':
+            sql, params = filmnights.filter(ends__gt=now).order_by('starts', 'id')[:1].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                self.assertIn('filmnight_tenant_ends_idx', ' '.join(str(row) for row in cursor.fetchall()))
+
+    def test_schedule_filmnight(self) -> None:
+        config = create_config()
+        filmnight = config.schedule_filmnight()
+        assert filmnight is not None
+        self.assertEqual((filmnight.starts, filmnight.get_phase()),
+                         (config.next_filmnight, FilmConfig.Phase.VOTING))
+        self.assertIsNone(config.schedule_filmnight())
+
+        config.next_filmnight += datetime.timedelta(hours=1)
+        self.assertEqual(config.schedule_filmnight(), filmnight)
+        self.assertEqual(Filmnight.objects.get().starts, config.next_filmnight)
+
+    def test_scheduler_skips_missed_filmnights(self) -> None:
+        slot = datetime.datetime.now().replace(microsecond=0) + datetime.timedelta(days=2)
+        config = create_config(next_filmnight=slot - 520 * datetime.timedelta(days=7))
+
+        output = StringIO()
+        # The scheduler closes its connection before each tick, which would end the test's transaction
+        with mock.patch('film_management.management.commands.run_scheduler.close_old_connections'), \
+                self.assertNumQueries(7):
+            call_command('run_scheduler', once=True, stdout=output)
+
+        # Ten years of missed weeks are skipped in one step, without a filmnight for each of them
+        config.refresh_from_db()
+        self.assertEqual(config.next_filmnight, slot)
+        self.assertEqual(list(Filmnight.objects.values_list('starts', flat=True)), [slot])
+        self.assertEqual(output.getvalue().splitlines(), [
+            f'Advanced next filmnight of {config.tenant} to {slot}',
+            f'Scheduled filmnight of {config.tenant} for {slot}',
+        ])
+
+    def test_dashboard_shows_recorded_winner(self) -> None:
+        cache.clear()
+        now = datetime.datetime.now()
+        filmnight = create_filmnight(voting_opens=now - datetime.timedelta(days=1),
+                                     starts=now - datetime.timedelta(hours=1), ends=now + datetime.timedelta(hours=23))
+        films = create_films(3)
+        filmnight.shortlist.set(films)
+        users = [User.objects.create(username=f'user{i}') for i in range(2)]
+        # A tie between the second and third films goes to the one added first
+        Vote.objects.bulk_create([Vote(user=users[0], film=films[2], filmnight=filmnight),
+                                  Vote(user=users[1], film=films[1], filmnight=filmnight)])
+        VoteTally(filmnight).rebuild()
+        self.assertEqual(VoteTally(filmnight).leader(), films[1].tmdb_id)
+        self.assertEqual(close_filmnight(filmnight), films[1])
+
+        # A vote recorded after closing changes the tally but not the winner
+        Vote.objects.create(user=users[1], film=films[2], filmnight=filmnight)
+        VoteTally(filmnight).rebuild()
+        self.assertEqual(VoteTally(filmnight).leader(), films[2].tmdb_id)
+        self.client.force_login(users[0])
+        self.assertRedirects(self.client.get('/dashboard/'), f'/films/{films[1].tmdb_id}',
+                             fetch_redirect_response=False)
+
+    def test_config_form_checks_voting_length(self) -> None:
+        config = create_config()
+        data = {'name': 'Philmnight', 'shortlist_length': 8, 'next_filmnight': '2030-01-04 20:00:00'}
+        self.assertTrue(FilmConfigForm(dict(data, voting_length='2 00:00:00'), instance=config).is_valid())
+
+        form = FilmConfigForm(dict(data, voting_length='8 00:00:00'), instance=config)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors().as_data()[0].code, 'voting_too_long')
+        self.assertFalse(FilmConfigForm(data, instance=config).is_valid())
+
+
+class ConfigCacheTests(TestCase):
+    """Check that each process reuses its copy of a config until the config's version is bumped."""
+
+    def test_config_reloaded_after_version_bump(self) -> None:
+        cache.clear()
+        tenant = default_tenant()
+        config = create_config()
+        self.assertEqual(get_config(tenant).name, config.name)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_config(tenant).name, config.name)
+
+        FilmConfig.objects.filter(id=config.id).update(name='Renamed', shortlist_length=3)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_config(tenant).name, config.name)
+
+        FilmConfig.bump_version(tenant.id)
+        with self.assertNumQueries(1):
+            reloaded = get_config(tenant)
+        self.assertEqual((reloaded.name, reloaded.shortlist_length), ('Renamed', 3))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'films.example.org'])
+class FragmentCacheTests(TestCase):
+    """Check that cached page fragments only show admin controls to superusers."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        create_config()
+        create_films(3)
+        submitter = User.objects.create(username='submitter', first_name='Sam', last_name='Submitter')
+        Film.objects.filter(tmdb_id=1).update(submitting_user=submitter)
+        self.member, self.admin = Client(), Client()
+        self.member.force_login(User.objects.create(username='member'))
+        self.admin.force_login(User.objects.create(username='admin', is_superuser=True, is_staff=True))
+
+    def test_superuser_variant_is_cached_separately(self) -> None:
+        for path, admin_only in (('/films/', 'film_management/delete_film/1'), ('/films/1', 'Submitting user: Sam')):
+            with self.subTest(path=path):
+                # Each variant is rendered once, whichever is cached first, and then served from the cache
+                for _ in range(2):
+                    self.assertNotContains(self.member.get(path), admin_only)
+                    self.assertContains(self.admin.get(path), admin_only)
+
+
+class MetricsTests(SimpleTestCase):
+    """Check that request metrics from several workers are exposed together."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        metrics._VIEW_INDEXES.clear()  # pylint: disable=protected-access
+
+    def test_workers_are_aggregated(self) -> None:
+        # Each worker process has its own copy of the histogram
+        workers = [metrics.Histogram('test_seconds', 'Test.', (0.1, 1)) for _ in range(2)]
+        workers[0].observe('/films/', 0.05)
+        workers[0].observe('/', 0.5)
+        workers[1].observe('/films/', 2.25)
+        for worker in workers:
+            worker.flush()
+        workers[1].observe('/films/', 0.5)
+        workers[1].flush()
+
+        self.assertEqual(workers[0].exposition(metrics.registered_views()), [
+            '# HELP test_seconds Test.', '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="/",le="0.1"} 0',
+            'test_seconds_bucket{view="/",le="1"} 1',
+            'test_seconds_bucket{view="/",le="+Inf"} 1',
+            'test_seconds_sum{view="/"} 0.5',
+            'test_seconds_count{view="/"} 1',
+            'test_seconds_bucket{view="/films/",le="0.1"} 1',
+            'test_seconds_bucket{view="/films/",le="1"} 2',
+            'test_seconds_bucket{view="/films/",le="+Inf"} 3',
+            'test_seconds_sum{view="/films/"} 2.8',
+            'test_seconds_count{view="/films/"} 3',
+        ])
+
+    def test_views_registered_at_once_share_an_index(self) -> None:
+        metrics.view_index('/')
+        metrics._VIEW_INDEXES.clear()  # pylint: disable=protected-access
+        # Another worker allocates an index for the same view but loses the claim to the first
+        with mock.patch.object(cache, 'get', side_effect=[None, 1]):
+            self.assertEqual(metrics.view_index('/'), 1)
+        self.assertEqual(metrics.registered_views(), {1: '/'})
+
+
+class TenantTests(TestCase):
+    """Check that tenants chosen by host or path only see their own config, films and votes."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.hosted = Tenant.objects.create(slug='hosted', domain='films.example.org')
+        self.society = Tenant.objects.create(slug='society')
+        for tenant in (default_tenant(), self.hosted, self.society):
+            create_config(tenant=tenant, name=f'{tenant.slug} night')
+            create_films(3, tenant=tenant)
+        filmnight = create_filmnight(tenant=self.society)
+        filmnight.shortlist.set(Film.objects.filter(tenant=self.society))
+        self.client.force_login(User.objects.create(username='member'))
+
+    def test_requests_are_served_for_their_tenant(self) -> None:
+        self.assertContains(self.client.get('/'), 'default night')
+        self.assertContains(self.client.get('/', HTTP_HOST='films.example.org'), 'hosted night')
+        self.assertContains(self.client.get('/society/'), 'society night')
+
+        response = self.client.get('/society/films/')
+        self.assertEqual({film.tenant_id for film in response.context['page']['films']}, {self.society.id})
+        self.assertContains(response, '/society/films/1')
+
+        # Only the society is voting, on its own shortlist
+        self.assertTemplateUsed(self.client.get('/dashboard/'), 'film_management/submit.html')
+        self.assertTemplateUsed(self.client.get('/society/dashboard/'), 'film_management/vote.html')
+        response = self.client.post('/society/film_management/submit_votes/', json.dumps([1]),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['votes'], [1])
+        self.assertEqual(Vote.objects.get().film.tenant, self.society)
+
+    def test_tenant_lookup(self) -> None:
+        self.client.get('/society/')
+        late = Tenant.objects.create(slug='late')
+        create_config(tenant=late, name='late night')
+        self.assertContains(self.client.get('/late/'), 'late night')
+
+        with self.settings(DEFAULT_TENANT=''):
+            self.assertEqual(self.client.get('/films/').status_code, 404)
+        with self.assertRaises(ValidationError):
+            Tenant(slug='films').full_clean()
+
+    def test_new_tenant_gets_a_config(self) -> None:
+        Tenant.objects.create(slug='newgroup')
+        self.assertTemplateUsed(self.client.get('/newgroup/dashboard/'), 'film_management/submit.html')
+        self.assertContains(self.client.get('/newgroup/'), 'Philmnight')
+        config = FilmConfig.objects.get(tenant__slug='newgroup')
+        self.assertEqual((config.filmnight_timedelta, config.voting_length),
+                         (datetime.timedelta(days=7), datetime.timedelta(days=1)))
+
+    def test_admins_only_manage_their_tenant(self) -> None:
+        secretary = User.objects.create(username='secretary')
+        self.society.admins.add(secretary)
+        self.client.force_login(secretary)
+
+        for path in ('/config/', '/film_management/control_panel/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get('/society' + path).status_code, 200)
+                # Sent to log in as someone else
+                self.assertEqual(self.client.get(path).status_code, 302)
+
+        self.assertNotContains(self.client.get('/films/'), 'delete_film')
+        self.assertContains(self.client.get('/society/films/'), '/society/film_management/delete_film/1')
+        self.client.get('/film_management/delete_film/1')
+        self.client.get('/society/film_management/delete_film/1')
+        self.assertEqual(sorted(Film.objects.filter(tmdb_id=1).values_list('tenant__slug', flat=True)),
+                         ['default', 'hosted'])
+
+
+def generate_dataset(users: int, films: int, filmnights: int = 10, shortlist_length: int = 8,
+                     seed: int = 0) -> Filmnight:
+    """
+    Fill the database with a synthetic watchlist and voting history.
+
+    Films get one to three genres and a catalogue entry each. For the
+    current and each past filmnight a shortlist is drawn and most users
+    vote for one to three films, favouring some films heavily over others
+    the way real votes do. Returns the current filmnight, in its voting phase.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    tenant = default_tenant()
+    create_config(shortlist_length=shortlist_length)
+
+    User.objects.bulk_create([
+        User(username=f'bench{i}', first_name=f'First{i}', last_name=f'Last{i}') for i in range(users)
+    ])
+    user_ids = list(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+
+    Film.objects.bulk_create([
+        Film(tenant=tenant, tmdb_id=tmdb_id, name=f'Film {tmdb_id}', description='Overview ' * 40, tagline='Tagline',
+             score=round(rng.uniform(2, 9), 1), watched=rng.random() < 0.2,
+             submitting_user_id=rng.choice(user_ids))
+        for tmdb_id in range(1, films + 1)
+    ], batch_size=500)
+    film_ids = dict(Film.objects.values_list('tmdb_id', 'id'))
+
+    genre_ids = list(Genre.objects.values_list('id', flat=True))
+    Film.genres.through.objects.bulk_create([
+        Film.genres.through(film_id=film_id, genre_id=genre_id)
+        for film_id in film_ids.values() for genre_id in rng.sample(genre_ids, rng.randint(1, 3))
+    ], batch_size=500)
+    CatalogueEntry.objects.bulk_create([
+        CatalogueEntry(tmdb_id=tmdb_id, title=f'Film {tmdb_id}', search_title=f'film {tmdb_id}',
+                       popularity=rng.paretovariate(1), imported=now)
+        for tmdb_id in range(1, films * 2 + 1)
+    ], batch_size=500)
+
+    votes = []
+    for weeks_ago in range(filmnights, -1, -1):
+        ago = datetime.timedelta(days=7 * weeks_ago)
+        filmnight = create_filmnight(voting_opens=now - ago - datetime.timedelta(hours=12),
+                                     starts=now - ago + datetime.timedelta(hours=12),
+                                     ends=now - ago + datetime.timedelta(hours=36),
+                                     shortlist_length=shortlist_length, closed=weeks_ago > 0)
+        shortlist = rng.sample(list(film_ids.values()), shortlist_length)
+        filmnight.shortlist.set(shortlist)
+        popularity = [rng.paretovariate(1.2) for _ in shortlist]
+        for user_id in user_ids:
+            if rng.random() < 0.8:
+                for film_id in set(rng.choices(shortlist, popularity, k=rng.randint(1, 3))):
+                    votes.append(Vote(user_id=user_id, film_id=film_id, filmnight=filmnight))
+    Vote.objects.bulk_create(votes, batch_size=500)
+
+    VoteTally(filmnight).rebuild()
+    return filmnight
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Drive the main views against a synthetic dataset and enforce query budgets.
+
+    Budgets are independent of the amount of data, so a view that starts
+    issuing a query per film, vote or user fails here. Each request is also
+    repeated after adding more data, to catch queries that scale with it.
+    Set BENCHMARK_REPORT to a path to write the query counts and timings
+    there as JSON.
+    """
+
+    USERS = 300
+    FILMS = 1500
+
+    # Queries with cold caches, including the four that load the tenants with their admins, session and user
+    BUDGETS = {
+        'dashboard': 9,
+        'submit_votes': 9,
+        'films': 8,
+        'films_json': 6,
+        'film': 6,
+        'search_films_catalogue': 6,
+        'search_films_tmdb': 7,
+        'control_panel': 6,
+    }
+
+    results: dict[str, dict[str, float]] = {}
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cache.clear()
+        cls.filmnight = generate_dataset(cls.USERS, cls.FILMS)
+        cls.user = User.objects.get(username='bench0')
+        cls.superuser = User.objects.create(username='admin', is_superuser=True, is_staff=True)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        if os.environ.get('BENCHMARK_REPORT'):
+            with open(os.environ['BENCHMARK_REPORT'], 'w', encoding='utf-8') as report:
+                json.dump(cls.results, report, indent=2)
+
+    def setUp(self) -> None:
+        self.stub = TMDBStub({
+            tmdb_id: stub_film(tmdb_id, f'Stub film {tmdb_id}') for tmdb_id in range(900001, 900011)
+        })
+        self.addCleanup(self.stub.close)
+        tmdb.set_client(self.stub.client())
+        self.addCleanup(tmdb.set_client, None)
+        self.client.force_login(self.user)
+
+    def measure(self, name: str, request: Callable[[], HttpResponse]) -> HttpResponse:
+        """Make a request with cold caches, recording and checking its query count."""
+        cache.clear()
+        SEARCH_CACHE.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+
+        self.assertLess(response.status_code, 400, name)
+        self.results[name] = {'queries': len(queries), 'seconds': round(elapsed, 4)}
+        self.assertLessEqual(len(queries), self.BUDGETS[name],
+                             f'{name} made {len(queries)} queries:\n' +
+                             '\n'.join(query['sql'] for query in queries.captured_queries))
+        return response
+
+    def assertConstantQueries(self, name: str, request: Callable[[], HttpResponse]) -> None:
+        """Check that a request makes as many queries after more data has been added."""
+        before = self.results[name]['queries']
+        extra = generate_more(self.filmnight, 50)
+        self.measure(name, request)
+        self.assertEqual(self.results[name]['queries'], before, f'{name} scales with {extra}')
+
+    def test_dashboard(self) -> None:
+        request = lambda: self.client.get('/dashboard/')  # noqa: E731
+        response = self.measure('dashboard', request)
+        self.assertEqual(len(response.context['shortlisted_films']), self.filmnight.shortlist_length)
+        self.assertConstantQueries('dashboard', request)
+
+    def test_submit_votes(self) -> None:
+        shortlist = list(self.filmnight.shortlist.order_by('id').values_list('tmdb_id', flat=True))
+        # Each request replaces the previous votes, so it both deletes and inserts
+        choices = iter([shortlist[0:2], shortlist[2:4], shortlist[4:6]])
+        request = lambda: self.client.post(  # noqa: E731
+            '/film_management/submit_votes/', json.dumps(next(choices)), content_type='application/json'
+        )
+        request()
+        self.assertTrue(self.measure('submit_votes', request).json()['success'])
+        self.assertConstantQueries('submit_votes', request)
+
+    def test_films(self) -> None:
+        request = lambda: self.client.get('/films/?sort=-score&watched=false')  # noqa: E731
+        response = self.measure('films', request)
+        self.assertEqual(len(response.context['page']['films']), 50)
+        self.assertConstantQueries('films', request)
+
+        request = lambda: self.client.get('/films/?sort=name&format=json')  # noqa: E731
+        next_page = self.measure('films_json', request).json()['next']
+        request = lambda: self.client.get(f'/films/?sort=name&format=json&cursor={next_page}')  # noqa: E731
+        self.assertEqual(len(self.measure('films_json', request).json()['films']), 50)
+        self.assertConstantQueries('films_json', request)
+
+    def test_film(self) -> None:
+        request = lambda: self.client.get('/films/1')  # noqa: E731
+        self.assertContains(self.measure('film', request), 'Film 1')
+        self.assertConstantQueries('film', request)
+
+    def test_search_films(self) -> None:
+        request = lambda: self.client.post('/film_management/search_films/', 'film 12',  # noqa: E731
+                                           content_type='text/plain')
+        self.assertEqual(len(self.measure('search_films_catalogue', request).json()['films']), 5)
+        self.assertConstantQueries('search_films_catalogue', request)
+
+        request = lambda: self.client.post('/film_management/search_films/', 'stub film',  # noqa: E731
+                                           content_type='text/plain')
+        self.assertEqual(len(self.measure('search_films_tmdb', request).json()['films']), 5)
+        self.assertIn('/search/movie', self.stub.requests)
+
+    def test_control_panel(self) -> None:
+        self.client.force_login(self.superuser)
+        request = lambda: self.client.get('/film_management/control_panel/')  # noqa: E731
+        self.measure('control_panel', request)
+        self.assertConstantQueries('control_panel', request)
+
+
+def generate_more(filmnight: Filmnight, count: int) -> str:
+    """Add users, films and current votes to a generated dataset. Return a description of them."""
+    start = Film.objects.order_by('-tmdb_id').values_list('tmdb_id', flat=True)[0] + 1
+    User.objects.bulk_create([User(username=f'more{start}-{i}') for i in range(count)])
+    new_users = list(User.objects.filter(username__startswith=f'more{start}-'))
+    create_films(count, start=start)
+    Vote.objects.bulk_create([
+        Vote(user=user, film=film, filmnight=filmnight)
+        for user in new_users for film in filmnight.shortlist.all()[:2]
+    ])
+    return f'{count} more users, films and voters'
@@ -23,5 +23,6 @@ urlpatterns = [
     path('', views.index),
     path('config/', views.ConfigView.as_view(), name='config'),
     path('logout/', views.logout_view),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
     path('login/', views.login_view, name='login')
 ]
@@ -7,9 +7,10 @@ from django.http import HttpResponseRedirect
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse
 from django.shortcuts import render
-from django.urls import reverse
+from django.urls import get_script_prefix, reverse
 
-from core.abstract_views import SuperuserView
+from core import metrics
+from core.abstract_views import SuperuserView, TenantAdminView
 from film_management.forms import FilmConfigForm
 from film_management.models import FilmConfig
 
@@ -28,17 +29,18 @@ def logout_view(request: HttpRequest) -> HttpResponse:
     return render(request, 'index.html', {})
 
 
-class ConfigView(SuperuserView):
+class ConfigView(TenantAdminView):
     template_name = 'config.html'
 
     def get(self, request: HttpRequest) -> HttpResponse:
         context = {
-            'config_form': FilmConfigForm(instance=FilmConfig.objects.get(pk=1))
+            'config_form': FilmConfigForm(instance=FilmConfig.objects.get_or_create(tenant=request.tenant)[0])
         }
         return render(request, self.template_name, context)
 
     def post(self, request: HttpRequest) -> HttpResponse:
-        config_form = FilmConfigForm(request.POST, request.FILES)
+        config_form = FilmConfigForm(request.POST, request.FILES,
+                                     instance=FilmConfig.objects.get_or_create(tenant=request.tenant)[0])
 
         if config_form.is_valid():
             messages.add_message(request, messages.SUCCESS, 'Config updated successfully')
@@ -48,6 +50,14 @@ class ConfigView(SuperuserView):
         return render(request, self.template_name, {'config_form': config_form})
 
 
+class MetricsView(SuperuserView):
+    """Request timing histograms of every worker, in the Prometheus text format."""
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Return the metrics of every worker."""
+        return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def login_view(request: HttpRequest) -> HttpResponse:
     """Login the given user with the provided credentials."""
     if request.method == 'POST':
@@ -59,5 +69,5 @@ def login_view(request: HttpRequest) -> HttpResponse:
 
             if user.check_password(password):
                 login(request, user, backend='django.contrib.auth.backends.ModelBackend')
-                return HttpResponseRedirect('/dashboard')
+                return HttpResponseRedirect(get_script_prefix() + 'dashboard')
     return render(request, 'login.html')
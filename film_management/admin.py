@@ -1,8 +1,11 @@
 """Admin module for films."""
 from django.contrib import admin
 
-from .models import Film, FilmConfig
+from .models import Film, FilmConfig, Filmnight, SubmissionJob, Vote
 # Register your models here.
 
 admin.site.register(Film)
 admin.site.register(FilmConfig)
+admin.site.register(Filmnight)
+admin.site.register(Vote)
+admin.site.register(SubmissionJob)
@@ -5,3 +5,7 @@ from django.apps import AppConfig
 
 class FilmManagementConfig(AppConfig):
     name = 'film_management'
+
+    def ready(self) -> None:
+        """Connect the signal handlers."""
+        from . import signals  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
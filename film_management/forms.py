@@ -2,39 +2,31 @@ import datetime
 from typing import cast
 
 from django.core.exceptions import ValidationError
-from django.db.models.query import QuerySet
 from django.forms import ModelForm
 
-from film_management.models import Film, FilmConfig
+from film_management.models import FilmConfig
 
 
 class FilmConfigForm(ModelForm):
 
     class Meta:
         model = FilmConfig
-        fields = ['name', 'shortlist', 'shortlist_length', 'next_filmnight',
-                  'voting_length']
+        fields = ['name', 'shortlist_length', 'next_filmnight', 'voting_length']
 
     def clean(self):
-        """Override clean function so shortlist can't be overpopulated."""
+        """Override clean function so voting can't outlast the time between filmnights."""
         errors = []
 
         cleaned_data = super().clean()
         voting_length = cast(datetime.timedelta, cleaned_data.get('voting_length'))
-        filmnight_timedelta = cast(datetime.timedelta, cleaned_data.get('filmnight_timedelta'))
+        # The time between filmnights is not edited here, so check against the saved schedule
+        filmnight_timedelta = cast(datetime.timedelta, self.instance.filmnight_timedelta)
 
-        shortlist = cast(QuerySet[Film], cleaned_data.get('shortlist'))
-        shortlist_length = cast(int, cleaned_data.get('shortlist_length'))
-
-        if voting_length > filmnight_timedelta:
+        if voting_length is not None and voting_length > filmnight_timedelta:
             errors.append(ValidationError(
                 'Voting period length should be less than time between filmnights',
                 code='voting_too_long'
             ))
 
-        if shortlist.count() > shortlist_length:
-            errors.append(ValidationError('Shortlist length exceeds max',
-                                          code='shortlist_too_long'))
-
         if errors:
             raise ValidationError(errors)
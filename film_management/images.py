@@ -0,0 +1,105 @@
+"""Resized copies of the logo and film images, stored under names derived from their content."""
+import hashlib
+from io import BytesIO
+from typing import IO
+
+from PIL import Image, features
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .tmdb import TMDBError, get_client
+
+DERIVATIVE_DIR = 'derivatives'
+WEBP = features.check('webp')
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+# Square icons, by name and edge length
+LOGO_ICONS = {'favicon': 32, 'apple-touch-icon': 180}
+# Logo widths; the logo is displayed 200px wide, so these cover 1x and 2x screens
+LOGO_WIDTHS = (200, 400)
+LOGO_FORMATS = ('png', 'webp') if WEBP else ('png',)
+
+# For each kind of film image, the TMDB size downloaded and the widths rendered from it.
+# Lists show posters 200px wide; film pages use the backdrop as a full-page background.
+FILM_IMAGES = {'poster': ('w500', (200, 400)), 'backdrop': ('w1280', (1280,))}
+FILM_IMAGE_FORMATS = ('jpeg', 'webp') if WEBP else ('jpeg',)
+
+
+def content_hash(data: bytes) -> str:
+    """Return a short hash identifying the content of a file."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def derivative_path(digest: str, name: str) -> str:
+    """Return the storage path of a derivative of the file with the given hash."""
+    return f'{DERIVATIVE_DIR}/{digest}-{name}'
+
+
+def tmdb_image_key(path: str) -> str:
+    """Return the name of a TMDB image without its extension; TMDB gives new images new names."""
+    return path.strip('/').rsplit('.', 1)[0]
+
+
+def film_image_name(kind: str, width: int, image_format: str) -> str:
+    """Return the derivative name of a film image at the given width and format."""
+    return f'{kind}-{width}.{EXTENSIONS[image_format]}'
+
+
+def store_resized(image: Image.Image, path: str, size: tuple[int, int], image_format: str) -> None:
+    """Resize an image and store it, keeping the aspect ratio if the height is 0."""
+    width, height = size
+    height = height or max(round(image.height * width / image.width), 1)
+    output = BytesIO()
+    image.resize((width, height), Image.LANCZOS).save(output, format=image_format, quality=82)
+    default_storage.save(path, ContentFile(output.getvalue()))
+
+
+def logo_derivatives() -> dict[str, tuple[tuple[int, int], str]]:
+    """
+    Return the logo derivatives to render, as {name: ((width, height), format)}.
+
+    A height of 0 keeps the aspect ratio of the source image.
+    """
+    derivatives = {f'{name}.png': ((size, size), 'png') for name, size in LOGO_ICONS.items()}
+    for width in LOGO_WIDTHS:
+        for image_format in LOGO_FORMATS:
+            derivatives[f'logo-{width}.{image_format}'] = ((width, 0), image_format)
+    return derivatives
+
+
+def render_logo_derivatives(source: IO[bytes], digest: str) -> None:
+    """Render every logo derivative that has not already been stored for this hash."""
+    image = Image.open(source).convert('RGBA')
+
+    for name, ((width, height), image_format) in logo_derivatives().items():
+        path = derivative_path(digest, name)
+        if not default_storage.exists(path):
+            store_resized(image, path, (width, height), image_format)
+
+
+def cache_film_image(path: str, kind: str) -> None:
+    """Download a TMDB poster or backdrop and store its thumbnails, unless they already exist."""
+    key = tmdb_image_key(path)
+    size, widths = FILM_IMAGES[kind]
+    missing = [
+        (width, image_format) for width in widths for image_format in FILM_IMAGE_FORMATS
+        if not default_storage.exists(derivative_path(key, film_image_name(kind, width, image_format)))
+    ]
+    if not missing:
+        return
+
+    image = Image.open(BytesIO(get_client().image(path, size))).convert('RGB')
+    for width, image_format in missing:
+        store_resized(image, derivative_path(key, film_image_name(kind, width, image_format)),
+                      (width, 0), image_format)
+
+
+def cache_film_images(poster_path: str, backdrop_path: str) -> bool:
+    """Cache thumbnails of whichever images a film has. Return whether every one was cached."""
+    try:
+        for kind, path in (('poster', poster_path), ('backdrop', backdrop_path)):
+            if path:
+                cache_film_image(path, kind)
+    except (TMDBError, OSError):
+        return False
+    return True
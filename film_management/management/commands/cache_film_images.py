@@ -0,0 +1,41 @@
+"""Store thumbnails of posters and backdrops for films that do not have them yet."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from film_management.images import cache_film_images
+from film_management.models import Film
+from film_management.tmdb import RateLimiter
+
+
+class Command(BaseCommand):
+    """Download and resize film images concurrently, e.g. for films added before images were cached."""
+
+    help = 'Cache poster and backdrop thumbnails for films that are missing them'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the concurrency and rate options."""
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent image downloads')
+        parser.add_argument('--rate', type=float, default=20,
+                            help='Maximum films fetched per second')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Download and resize the images of every film without cached thumbnails."""
+        films = list(Film.objects.filter(images_cached=False).values_list(
+            'id', 'tenant_id', 'poster_path', 'backdrop_path'
+        ))
+        limiter = RateLimiter(options['rate'])
+
+        def fetch(film: tuple[int, int, str, str]) -> tuple[int, int, bool]:
+            film_id, tenant_id, poster_path, backdrop_path = film
+            limiter.wait()
+            return film_id, tenant_id, cache_film_images(poster_path or '', backdrop_path or '')
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            cached = {film_id: tenant_id for film_id, tenant_id, success in pool.map(fetch, films) if success}
+
+        Film.objects.filter(id__in=cached).update(images_cached=True)
+        Film.bump_version(*cached.values())
+        self.stdout.write(self.style.SUCCESS(f'Cached images for {len(cached)} of {len(films)} films'))
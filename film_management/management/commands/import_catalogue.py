@@ -0,0 +1,70 @@
+"""Import TMDB's daily movie ID export into the local catalogue."""
+import gzip
+import json
+from typing import Any, Iterator
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.utils import timezone
+
+from film_management.models import CatalogueEntry, CatalogueWord
+from film_management.search import normalize
+
+
+def read_export(path: str) -> Iterator[dict[str, Any]]:
+    """Yield entries from a gzipped JSON-lines export one line at a time."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as export:
+        for line in export:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    """Stream a TMDB ID export into CatalogueEntry in fixed-size batches."""
+
+    help = 'Import a TMDB daily movie ID export (gzipped JSON lines) for local title search'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the export path and batch options."""
+        parser.add_argument('path', help='Path to movie_ids_MM_DD_YYYY.json.gz')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Replace the catalogue with the entries of the export and index their titles."""
+        started = timezone.now()
+        batch: list[CatalogueEntry] = []
+        imported = 0
+
+        for entry in read_export(options['path']):
+            if entry.get('adult') or entry.get('video'):
+                continue
+            title = (entry.get('title') or entry.get('original_title') or '')[:255]
+            if not title:
+                continue
+
+            batch.append(CatalogueEntry(
+                tmdb_id=entry['id'],
+                title=title,
+                search_title=normalize(title),
+                popularity=entry.get('popularity') or 0,
+                imported=started,
+            ))
+            if len(batch) >= options['batch_size']:
+                imported += self.write_batch(batch)
+                batch = []
+
+        imported += self.write_batch(batch)
+        removed, _ = CatalogueEntry.objects.filter(imported__lt=started).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} films, removed {removed} no longer in the export'
+        ))
+
+    @staticmethod
+    def write_batch(batch: list[CatalogueEntry]) -> int:
+        """Replace the rows for a batch, and the words indexing their titles, in one short transaction."""
+        with transaction.atomic():
+            CatalogueEntry.objects.filter(tmdb_id__in=[entry.tmdb_id for entry in batch]).delete()
+            CatalogueEntry.objects.bulk_create(batch)
+            CatalogueWord.objects.bulk_create([word for entry in batch for word in entry.words()])
+        return len(batch)
@@ -0,0 +1,138 @@
+"""Bulk import films into the watchlist by TMDB id."""
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from typing import Any, Iterable, Optional, TextIO
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from core.models import User
+from core.tenancy import tenant_from_option
+from film_management.images import cache_film_images
+from film_management.models import Film, UnreleasedFilmError, save_genres
+from film_management.tmdb import FilmNotFound, RateLimiter, TMDBError, get_client
+
+
+def read_ids(source: TextIO) -> list[int]:
+    """Return unique TMDB ids from a file with one id per line, keeping their order."""
+    ids: dict[int, None] = {}
+    for line in source:
+        line = line.split('#')[0].strip()
+        if line:
+            try:
+                ids[int(line)] = None
+            except ValueError as e:
+                raise CommandError(f'Invalid TMDB id: {line}') from e
+    return list(ids)
+
+
+class Command(BaseCommand):
+    """Fetch film metadata concurrently and insert the films in batches."""
+
+    help = 'Import films by TMDB id from a file (or - for stdin), one id per line'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the id file, submitter, tenant and throughput options."""
+        parser.add_argument('path', help='File of TMDB ids, or - to read from stdin')
+        parser.add_argument('--user', help='Username to record as the submitting user')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent TMDB requests')
+        parser.add_argument('--rate', type=float, default=20,
+                            help='Maximum TMDB requests per second')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--tenant',
+                            help='Slug of the tenant whose watchlist to import into (defaults to DEFAULT_TENANT)')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Import the listed films, then report how many were added and why the rest were skipped."""
+        user: Optional[User] = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist as e:
+                raise CommandError(f'No user named {options["user"]}') from e
+
+        if options['path'] == '-':
+            tmdb_ids = read_ids(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as source:
+                tmdb_ids = read_ids(source)
+
+        tenant = tenant_from_option(options['tenant'])
+        existing = set(Film.objects.filter(tenant=tenant).values_list('tmdb_id', flat=True))
+        skipped: dict[str, list[int]] = {
+            'already present': [tmdb_id for tmdb_id in tmdb_ids if tmdb_id in existing],
+            'unreleased': [],
+            'not found': [],
+            'failed': [],
+        }
+
+        client = get_client()
+        limiter = RateLimiter(options['rate'])
+
+        def fetch(tmdb_id: int) -> tuple[int, Optional[Film], str]:
+            limiter.wait()
+            try:
+                film_info = client.movie(tmdb_id)
+            except FilmNotFound:
+                return tmdb_id, None, 'not found'
+            except TMDBError:
+                return tmdb_id, None, 'failed'
+
+            film = Film(tenant=tenant, tmdb_id=tmdb_id, submitting_user=user)
+            try:
+                film.update_from_tmdb(film_info)
+            except UnreleasedFilmError:
+                return tmdb_id, None, 'unreleased'
+            except (KeyError, ValueError):
+                return tmdb_id, None, 'failed'
+            # Only films that will be imported have their images downloaded
+            film.images_cached = cache_film_images(film.poster_path or '', film.backdrop_path or '')
+            return tmdb_id, film, ''
+
+        imported = 0
+        batch: list[Film] = []
+
+        def write() -> None:
+            nonlocal imported
+            present = self.write_batch(batch)
+            imported += len(batch) - len(present)
+            skipped['already present'].extend(present)
+            batch.clear()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for tmdb_id, film, reason in pool.map(fetch, [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in existing]):
+                if film is None:
+                    skipped[reason].append(tmdb_id)
+                    continue
+                batch.append(film)
+                if len(batch) >= options['batch_size']:
+                    write()
+        write()
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} films'))
+        for reason, ids in skipped.items():
+            if ids:
+                self.stdout.write(f'Skipped {len(ids)} {reason}: {self.format_ids(ids)}')
+
+    @staticmethod
+    def write_batch(batch: list[Film]) -> list[int]:
+        """
+        Insert a batch of films and their genres. Return the TMDB ids of those already present.
+
+        Films submitted since the import started are left as they are, and
+        conflicts are ignored in case one is submitted during the insert.
+        """
+        if not batch:
+            return []
+        present = set(Film.objects.filter(
+            tenant=batch[0].tenant_id, tmdb_id__in=[film.tmdb_id for film in batch]
+        ).values_list('tmdb_id', flat=True))
+        new = [film for film in batch if film.tmdb_id not in present]
+        Film.objects.bulk_create(new, ignore_conflicts=True)
+        save_genres(new)
+        return [film.tmdb_id for film in batch if film.tmdb_id in present]
+
+    @staticmethod
+    def format_ids(ids: Iterable[int]) -> str:
+        """Return TMDB ids as a comma-separated list."""
+        return ', '.join(str(tmdb_id) for tmdb_id in ids)
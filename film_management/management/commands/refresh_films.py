@@ -0,0 +1,139 @@
+"""Refresh TMDB metadata of films on the watchlist that have not been refreshed recently."""
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import DecimalField, F, Q
+
+from film_management.images import cache_film_images
+from film_management.models import Film, UnreleasedFilmError, save_genres
+from film_management.tmdb import RateLimiter, TMDBError, get_client
+
+# Fields written by Film.update_from_tmdb
+TMDB_FIELDS = ('score', 'name', 'description', 'poster_path', 'backdrop_path', 'tagline', 'release_date')
+
+
+def normalize(field_name: str, value: Any) -> Any:
+    """Return a field value as it would be read back from the database."""
+    field = Film._meta.get_field(field_name)
+    if isinstance(field, DecimalField) and value is not None:
+        return round(Decimal(str(value)), field.decimal_places)
+    return value
+
+
+class Command(BaseCommand):
+    """
+    Refetch stale films concurrently with conditional requests and write back what changed.
+
+    Films are taken stalest first and marked refreshed a batch at a time,
+    so an interrupted run resumes where it stopped when started again.
+    """
+
+    help = 'Refresh TMDB metadata for films not refreshed within --max-age hours'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the refresh age and throughput options."""
+        parser.add_argument('--max-age', type=float, default=24,
+                            help='Refresh films last refreshed more than this many hours ago')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent TMDB requests')
+        parser.add_argument('--rate', type=float, default=20,
+                            help='Maximum TMDB requests per second')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--limit', type=int, help='Refresh at most this many films')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Refresh the metadata of every film older than --max-age from TMDB."""
+        cutoff = datetime.datetime.now() - datetime.timedelta(hours=options['max_age'])
+        stale = Film.objects.filter(
+            Q(refreshed_at__isnull=True) | Q(refreshed_at__lt=cutoff)
+        ).order_by(F('refreshed_at').asc(nulls_first=True), 'id')
+        film_ids = list(stale.values_list('id', flat=True)[:options['limit']])
+
+        client = get_client()
+        limiter = RateLimiter(options['rate'])
+
+        def fetch(film: Film) -> tuple[Film, Optional[dict[str, Any]], Optional[str], bool]:
+            limiter.wait()
+            try:
+                film_info, etag = client.conditional_movie(film.tmdb_id, film.tmdb_etag or None)
+            except TMDBError:
+                return film, None, None, False
+            images_cached = film.images_cached
+            if film_info is not None and (
+                    (film_info.get('poster_path') or '') != (film.poster_path or '')
+                    or (film_info.get('backdrop_path') or '') != (film.backdrop_path or '')):
+                images_cached = cache_film_images(film_info.get('poster_path') or '',
+                                                  film_info.get('backdrop_path') or '')
+            return film, film_info, etag, images_cached
+
+        totals = {'refreshed': 0, 'changed': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for start in range(0, len(film_ids), options['batch_size']):
+                batch = Film.objects.filter(
+                    id__in=film_ids[start:start + options['batch_size']]
+                ).only(
+                    'id', 'tenant_id', 'tmdb_id', 'tmdb_etag', 'images_cached', *TMDB_FIELDS
+                ).prefetch_related('genres')
+                for key, count in self.refresh_batch(pool.map(fetch, batch)).items():
+                    totals[key] += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {totals["refreshed"]} of {len(film_ids)} films, {totals["changed"]} changed'
+        ))
+        if totals['failed']:
+            self.stdout.write(f'{totals["failed"]} films could not be refreshed and remain stale')
+
+    @staticmethod
+    def refresh_batch(results: Any) -> dict[str, int]:
+        """Write the changed fields and genres of a batch of fetched films, and mark them refreshed."""
+        refreshed: list[int] = []
+        # Films grouped by the fields that changed, so each row only has those written
+        changed: dict[frozenset[str], list[Film]] = {}
+        regenred: list[Film] = []
+        # Tenants whose watchlists show a film that changed
+        tenant_ids: set[int] = set()
+        totals = {'refreshed': 0, 'changed': 0, 'failed': 0}
+
+        for film, film_info, etag, images_cached in results:
+            if film_info is None and etag is None:
+                totals['failed'] += 1
+                continue
+
+            fields = set()
+            if film_info is not None:
+                old = {name: normalize(name, getattr(film, name)) for name in TMDB_FIELDS}
+                old_genres = {genre.id for genre in film.genres.all()}
+                try:
+                    film.update_from_tmdb(film_info)
+                except (UnreleasedFilmError, KeyError, ValueError):
+                    totals['failed'] += 1
+                    continue
+                fields = {name for name in TMDB_FIELDS if normalize(name, getattr(film, name)) != old[name]}
+                if {genre['id'] for genre in film.tmdb_genres} != old_genres:
+                    regenred.append(film)
+                    fields.add('genres')
+            if images_cached != film.images_cached:
+                film.images_cached = images_cached
+                fields.add('images_cached')
+            if fields:
+                totals['changed'] += 1
+                tenant_ids.add(film.tenant_id)
+
+            if (etag or '') != film.tmdb_etag:
+                film.tmdb_etag = etag or ''
+                fields.add('tmdb_etag')
+            fields.discard('genres')
+            if fields:
+                changed.setdefault(frozenset(fields), []).append(film)
+            refreshed.append(film.id)
+
+        for fields, films in changed.items():
+            Film.objects.bulk_update(films, sorted(fields))
+        save_genres(regenred)
+        Film.objects.filter(id__in=refreshed).update(refreshed_at=datetime.datetime.now())
+        Film.bump_version(*tenant_ids)
+        totals['refreshed'] = len(refreshed)
+        return totals
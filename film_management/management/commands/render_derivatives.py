@@ -0,0 +1,30 @@
+"""Render resized copies of the configured logo."""
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from core.tenancy import tenant_from_option
+from film_management.models import FilmConfig
+
+
+class Command(BaseCommand):
+    """Render logo derivatives now instead of waiting for the next config save."""
+
+    help = 'Render the favicon, touch icon and resized logos from the configured logo'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the --force and --tenant options."""
+        parser.add_argument('--force', action='store_true',
+                            help='Render even if the logo has not changed')
+        parser.add_argument('--tenant', help='Slug of the tenant whose logo to render (defaults to DEFAULT_TENANT)')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Render the derivatives of a tenant's logo if it has changed."""
+        config = FilmConfig.objects.filter(tenant=tenant_from_option(options['tenant'])).first()
+        if config is None:
+            raise CommandError('No film config exists yet')
+
+        if config.update_logo_derivatives(force=options['force']):
+            self.stdout.write(self.style.SUCCESS(f'Rendered logo derivatives for {config.logo_hash}'))
+        else:
+            self.stdout.write('Logo derivatives are up to date')
@@ -0,0 +1,68 @@
+"""Process queued film submissions and logo changes."""
+import datetime
+import logging
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections
+from django.utils import timezone
+
+from film_management.models import FilmConfig, SubmissionJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Poll the submission queue and add films to the watchlist outside the request cycle."""
+
+    help = 'Run a worker that processes queued film submissions and renders changed logos'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the polling and stale job options."""
+        parser.add_argument('--poll-interval', type=float, default=1,
+                            help='Seconds to wait between checks when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Requeue jobs left running by a dead worker after this many seconds')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Requeue stale jobs, then process submissions until stopped."""
+        requeued = SubmissionJob.objects.filter(
+            status=SubmissionJob.Status.RUNNING,
+            updated__lt=timezone.now() - datetime.timedelta(seconds=options['stale_after'])
+        ).update(status=SubmissionJob.Status.PENDING, updated=timezone.now())
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale jobs')
+
+        while True:
+            close_old_connections()
+            job = SubmissionJob.claim()
+            if job is None:
+                self.render_logos()
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            try:
+                job.run()
+            except Exception:  # pylint: disable=broad-except
+                # e.g. the database went away while recording the outcome; a stale job is requeued on restart
+                logger.exception('Worker could not process job %s', job.id)
+                continue
+            self.stdout.write(f'Job {job.id} for film {job.tmdb_id}: {job.message}')
+
+    def render_logos(self) -> None:
+        """Render the derivatives of every logo changed since the last check."""
+        for config in FilmConfig.objects.filter(logo_pending=True):
+            try:
+                rendered = config.update_logo_derivatives()
+            except Exception:  # pylint: disable=broad-except
+                # e.g. the upload is not an image; the static logo stays until it is replaced
+                logger.exception('Worker could not render the logo of tenant %s', config.tenant_id)
+                FilmConfig.objects.filter(id=config.id, logo=config.logo.name).update(logo_pending=False)
+                continue
+            if rendered:
+                self.stdout.write(f'Rendered logo derivatives for {config.logo_hash}')
@@ -0,0 +1,70 @@
+"""Schedule filmnights, draw their shortlists and record their winners at phase boundaries."""
+import datetime
+import time
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections
+from django.utils import timezone
+
+from film_management.models import FilmConfig, Filmnight
+from film_management.shortlist import close_filmnight, draw_shortlist
+
+
+class Command(BaseCommand):
+    """Sleep until the next phase transition of any tenant, then do the work due at it."""
+
+    help = 'Run the scheduler that draws shortlists when voting opens and records winners when it closes'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the sleep limit and --once options."""
+        parser.add_argument('--max-sleep', type=float, default=60,
+                            help='Maximum seconds to sleep before reloading the config')
+        parser.add_argument('--once', action='store_true',
+                            help='Do any work that is due and exit')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Run scheduler ticks until stopped, sleeping until the next phase boundary between them."""
+        while True:
+            close_old_connections()
+            ends = self.tick()
+            if options['once']:
+                return
+            delay = (ends - timezone.now()).total_seconds() if ends else options['max_sleep']
+            time.sleep(min(max(delay, 0), options['max_sleep']))
+
+    def tick(self) -> Optional[datetime.datetime]:
+        """
+        Do the work due now. Return when more may be due, or None if nothing is scheduled.
+
+        Each tenant's recurring filmnight is created from its config, then
+        shortlists are drawn for filmnights of every tenant whose voting has
+        opened and winners are recorded for those whose voting has closed.
+        """
+        now = timezone.now()
+        boundaries = []
+
+        for config in FilmConfig.objects.select_related('tenant'):
+            _, filmnight, ends = config.schedule(now)
+            boundaries.append(ends)
+            if filmnight != config.next_filmnight:
+                FilmConfig.objects.filter(id=config.id).update(next_filmnight=filmnight)
+                FilmConfig.bump_version(config.tenant_id)
+                config.next_filmnight = filmnight
+                self.stdout.write(f'Advanced next filmnight of {config.tenant} to {filmnight}')
+            if config.schedule_filmnight(now) is not None:
+                self.stdout.write(f'Scheduled filmnight of {config.tenant} for {filmnight}')
+
+        for event in Filmnight.objects.filter(ends__gt=now, voting_opens__lte=now, starts__gt=now,
+                                              shortlist_drawn__isnull=True):
+            if draw_shortlist(event):
+                self.stdout.write(f'Drew shortlist for {event}')
+
+        for event in Filmnight.objects.filter(closed=False, starts__lte=now):
+            winner = close_filmnight(event)
+            if winner is not None:
+                self.stdout.write(f'{winner} won {event}')
+
+        for times in Filmnight.objects.filter(ends__gt=now).values_list('voting_opens', 'starts', 'ends'):
+            boundaries.extend(moment for moment in times if moment > now)
+        return min(boundaries, default=None)
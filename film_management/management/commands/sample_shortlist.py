@@ -0,0 +1,49 @@
+"""Draw a shortlist of films, optionally applying it to the current filmnight."""
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from core.tenancy import tenant_from_option
+from film_management.models import Film, Filmnight
+from film_management.shortlist import WEIGHTS, sample_shortlist
+from film_management.tally import VoteTally
+
+
+class Command(BaseCommand):
+    """Sample a shortlist from the unwatched films."""
+
+    help = 'Draw a random shortlist from unwatched films, optionally replacing the current one'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add the draw and --apply options."""
+        parser.add_argument('--size', type=int,
+                            help="Number of films (defaults to the current filmnight's shortlist_length)")
+        parser.add_argument('--weight', choices=sorted(WEIGHTS),
+                            help='Favour older submissions or higher TMDB scores')
+        parser.add_argument('--genre', type=int, action='append', dest='genres',
+                            help='Only draw films in this TMDB genre id (repeatable)')
+        parser.add_argument('--seed', type=int, help='Seed for a reproducible draw')
+        parser.add_argument('--apply', action='store_true',
+                            help="Replace the current filmnight's shortlist with the draw")
+        parser.add_argument('--tenant', help='Slug of the tenant to draw from (defaults to DEFAULT_TENANT)')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Print a shortlist drawn for the tenant's current filmnight, replacing its shortlist with --apply."""
+        tenant = tenant_from_option(options['tenant'])
+        filmnight = Filmnight.objects.filter(tenant=tenant).current()
+        if filmnight is None:
+            raise CommandError('No filmnight is scheduled')
+        film_ids = sample_shortlist(tenant.id, options['size'] or filmnight.shortlist_length,
+                                    weight=options['weight'], genres=options['genres'],
+                                    seed=options['seed'])
+
+        for film in Film.objects.filter(id__in=film_ids).order_by('name'):
+            self.stdout.write(f'{film.tmdb_id}\t{film.name}')
+
+        if options['apply']:
+            filmnight.shortlist.set(film_ids)
+            Filmnight.objects.filter(id=filmnight.id).update(shortlist_drawn=timezone.now())
+            Filmnight.bump_version(tenant.id)
+            VoteTally(filmnight).rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Shortlist replaced with {len(film_ids)} films'))
@@ -0,0 +1,74 @@
+# Generated by Django 3.2 on 2026-10-18 14:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def migrate_current_votes(apps, schema_editor):
+    """Move comma-separated User.current_votes into Vote rows for the upcoming filmnight."""
+    User = apps.get_model('core', 'User')
+    Film = apps.get_model('film_management', 'Film')
+    FilmConfig = apps.get_model('film_management', 'FilmConfig')
+    Vote = apps.get_model('film_management', 'Vote')
+
+    config = FilmConfig.objects.filter(pk=1).first()
+    if config is None:
+        return
+
+    film_ids = dict(Film.objects.values_list('tmdb_id', 'id'))
+    votes = []
+    for user in User.objects.exclude(current_votes='').only('id', 'current_votes'):
+        for tmdb_id in set(user.current_votes.split(',')):
+            if tmdb_id.isdigit() and int(tmdb_id) in film_ids:
+                votes.append(Vote(user_id=user.id, film_id=film_ids[int(tmdb_id)],
+                                  filmnight=config.next_filmnight))
+    Vote.objects.bulk_create(votes, batch_size=500)
+
+
+def restore_current_votes(apps, schema_editor):
+    """Collapse Vote rows for the upcoming filmnight back into User.current_votes."""
+    User = apps.get_model('core', 'User')
+    FilmConfig = apps.get_model('film_management', 'FilmConfig')
+    Vote = apps.get_model('film_management', 'Vote')
+
+    config = FilmConfig.objects.filter(pk=1).first()
+    if config is None:
+        return
+
+    current_votes = {}
+    for user_id, tmdb_id in Vote.objects.filter(filmnight=config.next_filmnight).values_list(
+            'user_id', 'film__tmdb_id'):
+        current_votes.setdefault(user_id, []).append(str(tmdb_id))
+    for user_id, tmdb_ids in current_votes.items():
+        User.objects.filter(id=user_id).update(current_votes=','.join(tmdb_ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0002_auto_20211019_2250'),
+        ('film_management', '0004_alter_filmconfig_shortlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filmnight', models.DateTimeField()),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='film_management.film')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['filmnight', 'film'], name='vote_filmnight_film_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'filmnight', 'film'), name='unique_vote'),
+        ),
+        migrations.RunPython(migrate_current_votes, restore_current_votes),
+    ]
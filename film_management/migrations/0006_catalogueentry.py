@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0005_vote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueEntry',
+            fields=[
+                ('tmdb_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('search_title', models.CharField(db_index=True, max_length=255)),
+                ('popularity', models.FloatField(default=0)),
+                ('imported', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='catalogueentry',
+            index=models.Index(fields=['-popularity'], name='catalogue_popularity_idx'),
+        ),
+    ]
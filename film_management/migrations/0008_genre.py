@@ -0,0 +1,81 @@
+# Generated by Django 3.2 on 2026-10-18 14:58
+
+from django.db import migrations, models
+
+# TMDB's movie genre list, used to map the names previously stored in Film._genres
+TMDB_GENRES = {
+    'Action': 28,
+    'Adventure': 12,
+    'Animation': 16,
+    'Comedy': 35,
+    'Crime': 80,
+    'Documentary': 99,
+    'Drama': 18,
+    'Family': 10751,
+    'Fantasy': 14,
+    'History': 36,
+    'Horror': 27,
+    'Music': 10402,
+    'Mystery': 9648,
+    'Romance': 10749,
+    'Science Fiction': 878,
+    'TV Movie': 10770,
+    'Thriller': 53,
+    'War': 10752,
+    'Western': 37,
+}
+
+
+def populate_genres(apps, schema_editor):
+    """Link films to Genre rows using the comma-separated names in Film._genres."""
+    Film = apps.get_model('film_management', 'Film')
+    Genre = apps.get_model('film_management', 'Genre')
+    through = Film.genres.through
+
+    Genre.objects.bulk_create([Genre(id=genre_id, name=name) for name, genre_id in TMDB_GENRES.items()])
+
+    links = []
+    for film_id, genres in Film.objects.values_list('id', '_genres'):
+        for name in set((genres or '').split(',')):
+            if name.strip() in TMDB_GENRES:
+                links.append(through(film_id=film_id, genre_id=TMDB_GENRES[name.strip()]))
+    through.objects.bulk_create(links, batch_size=500)
+
+
+def restore_genres(apps, schema_editor):
+    """Write genre names back into Film._genres."""
+    Film = apps.get_model('film_management', 'Film')
+
+    for film in Film.objects.prefetch_related('genres'):
+        film._genres = ','.join(genre.name for genre in film.genres.all())
+        film.save(update_fields=['_genres'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0007_submissionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='films', to='film_management.Genre'),
+        ),
+        migrations.RunPython(populate_genres, restore_genres),
+        migrations.RemoveField(
+            model_name='film',
+            name='_genres',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0008_genre'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='filmconfig',
+            name='logo_favicon',
+        ),
+        migrations.AddField(
+            model_name='filmconfig',
+            name='logo_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0009_logo_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='images_cached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
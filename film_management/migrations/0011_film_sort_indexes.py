@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0010_film_images_cached'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['name', 'id'], name='film_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['date_submitted', 'id'], name='film_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['score', 'id'], name='film_score_idx'),
+        ),
+    ]
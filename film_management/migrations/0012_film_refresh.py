@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0011_film_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='tmdb_etag',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['refreshed_at', 'id'], name='film_refreshed_idx'),
+        ),
+    ]
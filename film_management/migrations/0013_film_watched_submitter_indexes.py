@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0012_film_refresh'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['watched', 'id'], name='film_watched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['submitting_user', 'date_submitted'], name='film_submitter_idx'),
+        ),
+    ]
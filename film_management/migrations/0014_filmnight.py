@@ -0,0 +1,167 @@
+# Generated by Django 3.2 on 2026-10-18 15:40
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# FilmConfig.FILMNIGHT_LENGTH when this migration was written
+FILMNIGHT_LENGTH = datetime.timedelta(days=1)
+
+
+def create_filmnights(apps, schema_editor):
+    """Create a Filmnight for each filmnight with votes and for the upcoming one, and link votes to them."""
+    Film = apps.get_model('film_management', 'Film')
+    FilmConfig = apps.get_model('film_management', 'FilmConfig')
+    Filmnight = apps.get_model('film_management', 'Filmnight')
+    Vote = apps.get_model('film_management', 'Vote')
+
+    config = FilmConfig.objects.filter(pk=1).first()
+    voting_length = config.voting_length if config is not None else datetime.timedelta(days=1)
+    shortlist_length = config.shortlist_length if config is not None else 8
+    now = datetime.datetime.now()
+
+    dates = set(Vote.objects.values_list('filmnight', flat=True).distinct())
+    if config is not None:
+        dates.add(config.next_filmnight)
+
+    latest_closed = None
+    for starts in sorted(dates):
+        filmnight = Filmnight.objects.create(
+            voting_opens=starts - voting_length, starts=starts, ends=starts + FILMNIGHT_LENGTH,
+            recurring=True, shortlist_length=shortlist_length, closed=starts < now,
+        )
+        Vote.objects.filter(filmnight=starts).update(event=filmnight)
+
+        if filmnight.closed:
+            # Ties go to the film added first, as in film_management.tally.choose_winner
+            winner = Film.objects.filter(vote__event=filmnight).annotate(
+                vote_count=models.Count('vote')
+            ).order_by('-vote_count', 'id').first()
+            Filmnight.objects.filter(id=filmnight.id).update(winner=winner, shortlist_drawn=filmnight.voting_opens)
+            latest_closed = (filmnight, winner)
+        elif config is not None and starts == config.next_filmnight:
+            filmnight.shortlist.set(config.shortlist.all())
+            if config.last_shortlist > filmnight.voting_opens:
+                Filmnight.objects.filter(id=filmnight.id).update(shortlist_drawn=config.last_shortlist)
+
+    # The winner used to be marked watched only when the next shortlist was drawn, and closing a filmnight
+    # now does it instead, so mark the latest winner if its filmnight closed since the last draw
+    if latest_closed is not None and latest_closed[1] is not None:
+        filmnight, winner = latest_closed
+        if config is None or config.last_shortlist is None or config.last_shortlist < filmnight.starts:
+            Film.objects.filter(id=winner.id).update(watched=True)
+
+
+def restore_filmnights(apps, schema_editor):
+    """Copy filmnight dates back onto votes, and the latest shortlist back onto the config."""
+    FilmConfig = apps.get_model('film_management', 'FilmConfig')
+    Filmnight = apps.get_model('film_management', 'Filmnight')
+    Vote = apps.get_model('film_management', 'Vote')
+
+    for filmnight in Filmnight.objects.all():
+        Vote.objects.filter(event=filmnight).update(filmnight=filmnight.starts)
+
+    config = FilmConfig.objects.filter(pk=1).first()
+    latest = Filmnight.objects.exclude(shortlist_drawn=None).order_by('-starts').first()
+    if config is not None:
+        config.last_shortlist = latest.shortlist_drawn if latest is not None else datetime.datetime(1, 1, 1)
+        config.save(update_fields=['last_shortlist'])
+        if latest is not None:
+            config.shortlist.set(latest.shortlist.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0013_film_watched_submitter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Filmnight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=80)),
+                ('voting_opens', models.DateTimeField()),
+                ('starts', models.DateTimeField()),
+                ('ends', models.DateTimeField()),
+                ('recurring', models.BooleanField(default=False)),
+                ('shortlist_length', models.IntegerField(default=8)),
+                ('shortlist_drawn', models.DateTimeField(blank=True, null=True)),
+                ('closed', models.BooleanField(default=False)),
+                ('shortlist', models.ManyToManyField(blank=True, related_name='filmnights',
+                                                     to='film_management.Film')),
+                ('winner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                             related_name='+', to='film_management.film')),
+            ],
+            options={
+                'ordering': ['starts'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='filmnight',
+            index=models.Index(fields=['ends'], name='filmnight_ends_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filmnight',
+            index=models.Index(condition=models.Q(closed=False), fields=['starts'], name='filmnight_open_idx'),
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='event',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='votes', to='film_management.filmnight'),
+        ),
+        # Nullable while moving, so that the old columns can be restored when migrating backwards
+        migrations.AlterField(
+            model_name='vote',
+            name='filmnight',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='filmconfig',
+            name='last_shortlist',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(create_filmnights, restore_filmnights),
+        migrations.RemoveConstraint(
+            model_name='vote',
+            name='unique_vote',
+        ),
+        migrations.RemoveIndex(
+            model_name='vote',
+            name='vote_filmnight_film_idx',
+        ),
+        migrations.RemoveField(
+            model_name='vote',
+            name='filmnight',
+        ),
+        migrations.RenameField(
+            model_name='vote',
+            old_name='event',
+            new_name='filmnight',
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='filmnight',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes',
+                                    to='film_management.filmnight'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'filmnight', 'film'), name='unique_vote'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['filmnight', 'film'], name='vote_filmnight_film_idx'),
+        ),
+        migrations.RemoveField(
+            model_name='filmconfig',
+            name='shortlist',
+        ),
+        migrations.RemoveField(
+            model_name='filmconfig',
+            name='last_shortlist',
+        ),
+    ]
@@ -0,0 +1,138 @@
+# Generated by Django 3.2 on 2026-10-18 15:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# core.models.DEFAULT_TENANT_SLUG when this migration was written
+DEFAULT_TENANT_SLUG = 'default'
+TENANT_MODELS = ('Film', 'FilmConfig', 'Filmnight', 'SubmissionJob')
+
+
+def assign_default_tenant(apps, schema_editor):
+    """Move the existing config, watchlist, filmnights and queued submissions to the default tenant."""
+    Tenant = apps.get_model('core', 'Tenant')
+    tenant, _ = Tenant.objects.get_or_create(slug=DEFAULT_TENANT_SLUG)
+    for model_name in TENANT_MODELS:
+        apps.get_model('film_management', model_name).objects.filter(tenant=None).update(tenant=tenant)
+
+
+def check_single_tenant(apps, schema_editor):
+    """Refuse to migrate backwards once films of more than one tenant share a TMDB id."""
+    Film = apps.get_model('film_management', 'Film')
+    if Film.objects.values('tmdb_id').annotate(count=models.Count('id')).filter(count__gt=1).exists():
+        raise ValueError('Films of several tenants share a TMDB id; delete all but one tenant first')
+
+
+def tenant_field(model, related_name):
+    """Return the tenant field of a model, nullable until existing rows have been assigned."""
+    return model(null=True, on_delete=django.db.models.deletion.CASCADE, related_name=related_name, to='core.tenant')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tenant'),
+        ('film_management', '0014_filmnight'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_submitted_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_score_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_watched_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_submitter_idx',
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='tenant',
+            field=tenant_field(models.ForeignKey, 'films'),
+        ),
+        migrations.AddField(
+            model_name='filmconfig',
+            name='tenant',
+            field=tenant_field(models.OneToOneField, 'config'),
+        ),
+        migrations.AddField(
+            model_name='filmnight',
+            name='tenant',
+            field=tenant_field(models.ForeignKey, 'filmnights'),
+        ),
+        migrations.AddField(
+            model_name='submissionjob',
+            name='tenant',
+            field=tenant_field(models.ForeignKey, '+'),
+        ),
+        # Going backwards, TMDB ids are checked to be unique before the constraint returns
+        migrations.AlterField(
+            model_name='film',
+            name='tmdb_id',
+            field=models.IntegerField(default=1, null=True),
+        ),
+        migrations.RunPython(assign_default_tenant, check_single_tenant),
+        migrations.AlterField(
+            model_name='film',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='films',
+                                    to='core.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='filmconfig',
+            name='tenant',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='config',
+                                       to='core.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='filmnight',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filmnights',
+                                    to='core.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='submissionjob',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                    to='core.tenant'),
+        ),
+        migrations.AddConstraint(
+            model_name='film',
+            constraint=models.UniqueConstraint(fields=('tenant', 'tmdb_id'), name='unique_tenant_film'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['tenant', 'name', 'id'], name='film_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['tenant', 'date_submitted', 'id'], name='film_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['tenant', 'score', 'id'], name='film_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['tenant', 'watched', 'id'], name='film_watched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['tenant', 'submitting_user', 'date_submitted'], name='film_submitter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filmnight',
+            index=models.Index(fields=['tenant', 'ends'], name='filmnight_tenant_ends_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 15:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 2000
+
+
+def index_words(apps, schema_editor):
+    """Index the words of titles already in the catalogue, as CatalogueEntry.words does."""
+    CatalogueEntry = apps.get_model('film_management', 'CatalogueEntry')
+    CatalogueWord = apps.get_model('film_management', 'CatalogueWord')
+
+    batch = []
+    for tmdb_id, search_title, popularity in CatalogueEntry.objects.values_list(
+            'tmdb_id', 'search_title', 'popularity').iterator():
+        words = search_title.split(' ')
+        batch += [CatalogueWord(entry_id=tmdb_id, suffix=' '.join(words[start:]), popularity=popularity)
+                  for start in range(1, len(words))]
+        if len(batch) >= BATCH_SIZE:
+            CatalogueWord.objects.bulk_create(batch)
+            batch = []
+    CatalogueWord.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0015_tenant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suffix', models.CharField(max_length=255)),
+                ('popularity', models.FloatField(default=0)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                            to='film_management.catalogueentry')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='catalogueword',
+            index=models.Index(fields=['suffix'], name='catalogue_word_suffix_idx'),
+        ),
+        migrations.RunPython(index_words, migrations.RunPython.noop),
+    ]
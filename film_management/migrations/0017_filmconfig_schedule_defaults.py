@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 15:57
+
+import datetime
+from django.db import migrations, models
+import film_management.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0016_catalogueword'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filmconfig',
+            name='filmnight_timedelta',
+            field=models.DurationField(default=datetime.timedelta(days=7)),
+        ),
+        migrations.AlterField(
+            model_name='filmconfig',
+            name='next_filmnight',
+            field=models.DateTimeField(default=film_management.models.default_next_filmnight),
+        ),
+        migrations.AlterField(
+            model_name='filmconfig',
+            name='voting_length',
+            field=models.DurationField(default=datetime.timedelta(days=1)),
+        ),
+    ]
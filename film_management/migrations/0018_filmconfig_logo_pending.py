@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+def queue_logos(apps, schema_editor):
+    """Point configs at the logo that ships in media/, and queue every unrendered logo for run_film_worker."""
+    FilmConfig = apps.get_model('film_management', 'FilmConfig')
+    FilmConfig.objects.filter(logo='logo/default.png').update(logo='logo/logo.png')
+    FilmConfig.objects.filter(logo_hash='').update(logo_pending=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film_management', '0017_filmconfig_schedule_defaults'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filmconfig',
+            name='logo_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='filmconfig',
+            name='logo',
+            field=models.ImageField(default='logo/logo.png', upload_to='config/'),
+        ),
+        migrations.RunPython(queue_logos, migrations.RunPython.noop),
+    ]
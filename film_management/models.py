@@ -2,33 +2,102 @@
 from __future__ import annotations
 import datetime
 from enum import Enum
-from typing import Any
-
-from PIL import Image
-from django.db import models
+from io import BytesIO
+import logging
+from typing import Any, Iterable, Optional
+import uuid
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import models, transaction
 from django.db.utils import IntegrityError
 from django.utils import timezone
-import requests
 
-from core.models import User
-from philmnight.settings import TMDB_ENDPOINT, TMDB_KEY
+from core.models import Tenant, User
+
+from .images import (
+    cache_film_images, content_hash, derivative_path, film_image_name, render_logo_derivatives, tmdb_image_key
+)
+from .tmdb import FilmNotFound, TMDBError, get_client
+
+
+# Cache keys of tokens that change whenever a tenant's config, films or filmnights are written,
+# followed by the tenant's id
+CONFIG_VERSION_KEY = 'film_config:version'
+FILMS_VERSION_KEY = 'films:version'
+FILMNIGHTS_VERSION_KEY = 'filmnights:version'
+
+logger = logging.getLogger(__name__)
+
+
+def cache_version(key: str) -> str:
+    """Return the token identifying the current version of some cached data."""
+    return cache.get_or_set(key, lambda: uuid.uuid4().hex, None)
+
+
+def bump_cache_version(key: str) -> None:
+    """
+    Change the version of some cached data, invalidating everything cached under the old one.
+
+    The version changes again once the current transaction commits, so a
+    worker that reloaded before the commit does not keep the old data.
+    """
+    def bump() -> None:
+        cache.set(key, uuid.uuid4().hex, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class UnreleasedFilmError(IntegrityError):
+    """Raised when a film that has not been released yet is submitted."""
+
+
+class Genre(models.Model):
+    """A TMDB film genre, keyed by its TMDB id."""
+
+    id = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self) -> str:
+        """Return a string representation of the genre."""
+        return self.name
+
+
+class FilmQuerySet(models.QuerySet):
+    """Queryset helpers for films."""
+
+    def with_votes(self, filmnight: Optional[Filmnight] = None) -> FilmQuerySet:
+        """Annotate each film with its vote count for the given filmnight in a single query."""
+        vote_filter = models.Q(vote__filmnight=filmnight) if filmnight is not None else None
+        return self.annotate(vote_count=models.Count('vote', filter=vote_filter))
 
 
 # pylint: disable=too-many-instance-attributes
 class Film(models.Model):
     """Stores information regarding an individual film."""
 
-    tmdb_id = models.IntegerField(default=1, null=True, unique=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='films')
+    tmdb_id = models.IntegerField(default=1, null=True)
 
     score = models.DecimalField(default=-1, null=True, decimal_places=1, max_digits=3)
     name = models.CharField(max_length=70, blank=False)
     description = models.TextField(default='', null=True)
     tagline = models.TextField(default='', null=True)
     watched = models.BooleanField(default=False)
-    _genres = models.TextField(default='', null=True)
+    genres = models.ManyToManyField(Genre, blank=True, related_name='films')
 
     poster_path = models.CharField(default='', max_length=100, null=True)
     backdrop_path = models.CharField(default='', max_length=100, null=True)
+    # Whether thumbnails of the poster and backdrop are stored locally
+    images_cached = models.BooleanField(default=False)
+
+    # The ETag of the TMDB response the film was last refreshed from, and when
+    tmdb_etag = models.CharField(default='', max_length=100, blank=True)
+    refreshed_at = models.DateTimeField(blank=True, null=True)
 
     submitting_user = models.ForeignKey(User, blank=True, null=True,
                                         on_delete=models.CASCADE)
@@ -36,125 +105,505 @@ class Film(models.Model):
     date_submitted = models.DateTimeField(auto_now_add=True, blank=True)
     release_date = models.DateTimeField(blank=True, auto_now_add=True)
 
-    @property
-    def genres(self) -> list[str]:
-        """Return film genres as a list."""
-        return self._genres.split(',')
-
-    @property
-    def votes(self) -> int:
-        """Return number of voters."""
-        users = User.objects.all()
-        vote_count = 0
-        for user in users:
-            films = user.profile.current_votes.split(',')
-            if str(self.tmdb_id) in films:
-                vote_count += 1
-        return vote_count
-
-    @property
-    def voters(self) -> list[User]:
-        """Return list containing usernames of voters."""
-        users = User.objects.all()
-        voters_list = []
-        for user in users:
-            films = user.profile.current_votes.split(',')
-            if str(self.tmdb_id) in films:
-                voters_list.append(user.first_name + user.last_name)
-        return voters_list
+    objects = FilmQuerySet.as_manager()
+
+    # Genres fetched from TMDB, written by save_genres once the film has been saved
+    tmdb_genres: list[dict[str, Any]]
+
+    class Meta:
+        constraints = [
+            # Each tenant has its own watchlist, so a film may be submitted once to each
+            models.UniqueConstraint(fields=['tenant', 'tmdb_id'], name='unique_tenant_film'),
+        ]
+        indexes = [
+            # Keyset pagination of a tenant's watchlist orders by each of these, then id
+            models.Index(fields=['tenant', 'name', 'id'], name='film_name_idx'),
+            models.Index(fields=['tenant', 'date_submitted', 'id'], name='film_submitted_idx'),
+            models.Index(fields=['tenant', 'score', 'id'], name='film_score_idx'),
+            # The shortlist draws from unwatched films; the watchlist filters by watched and submitter
+            models.Index(fields=['tenant', 'watched', 'id'], name='film_watched_idx'),
+            models.Index(fields=['tenant', 'submitting_user', 'date_submitted'], name='film_submitter_idx'),
+            # refresh_films takes the stalest films first
+            models.Index(fields=['refreshed_at', 'id'], name='film_refreshed_idx'),
+        ]
 
     def __str__(self) -> str:
         """Return a string representation of the model."""
         return self.name
 
-    # pylint: disable=signature-differs
-    def save(self, *args: Any, **kwargs: Any) -> None:
-        """
-        Override save argument of film model.
+    @staticmethod
+    def cache_version(tenant_id: int) -> str:
+        """Return the token identifying the current version of a tenant's watchlist."""
+        return cache_version(f'{FILMS_VERSION_KEY}:{tenant_id}')
 
-        Override save argument of film model to populate film_id
-        field and search TMDB for film data and appropriate poster.
+    @staticmethod
+    def bump_version(*tenant_ids: int) -> None:
         """
-        request_path = (TMDB_ENDPOINT + 'movie/' + str(self.tmdb_id) + '?api_key=' + TMDB_KEY)
-        film_info = requests.get(request_path).json()
+        Invalidate cached pages showing the films of the given tenants.
 
+        Saving or deleting a film does this through signals; call it after
+        bulk operations and queryset updates, which send none.
+        """
+        for tenant_id in set(tenant_ids):
+            bump_cache_version(f'{FILMS_VERSION_KEY}:{tenant_id}')
+
+    def poster_url(self, width: int = 200, image_format: str = 'jpeg') -> Optional[str]:
+        """Return the URL of a stored poster thumbnail, or None if there is none."""
+        if not (self.images_cached and self.poster_path):
+            return None
+        return default_storage.url(derivative_path(tmdb_image_key(self.poster_path),
+                                                   film_image_name('poster', width, image_format)))
+
+    def backdrop_url(self, width: int = 1280, image_format: str = 'jpeg') -> Optional[str]:
+        """Return the URL of a stored backdrop, or None if there is none."""
+        if not (self.images_cached and self.backdrop_path):
+            return None
+        return default_storage.url(derivative_path(tmdb_image_key(self.backdrop_path),
+                                                   film_image_name('backdrop', width, image_format)))
+
+    def update_from_tmdb(self, film_info: dict[str, Any]) -> None:
+        """Populate the film from a TMDB movie response, rejecting unreleased films and those with no release date."""
         self.score = film_info.get('vote_average', -1)
         self.name = film_info.get('title', 'Unknown')
         self.description = film_info.get('overview', 'No description available')
         self.poster_path = film_info.get('poster_path', '')
         self.backdrop_path = film_info.get('backdrop_path', '')
         self.tagline = film_info.get('tagline', '')
-        self._genres = ','.join([genre['name'] for genre in film_info['genres']])
+        self.tmdb_genres = film_info['genres']
 
+        # TMDB sends an empty string when the release date is not known yet
+        if not film_info['release_date']:
+            raise UnreleasedFilmError(self.name + ' has no release date yet')
         release_date = datetime.datetime.strptime(film_info['release_date'], '%Y-%m-%d')
         if datetime.datetime.now() < release_date:
-            raise IntegrityError(self.name + ' has not been released yet. Released: ' +
-                                 str(release_date) + '\nUnprocessed: ' +
-                                 film_info['release_date'])
+            raise UnreleasedFilmError(self.name + ' has not been released yet. Released: ' +
+                                      str(release_date) + '\nUnprocessed: ' +
+                                      film_info['release_date'])
         self.release_date = release_date
 
+    # pylint: disable=signature-differs
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Override save argument of film model.
+
+        Override save argument of film model to populate film_id
+        field and search TMDB for film data and appropriate poster.
+        """
+        self.update_from_tmdb(get_client().movie(self.tmdb_id))
+        self.images_cached = cache_film_images(self.poster_path or '', self.backdrop_path or '')
         super(Film, self).save(*args, **kwargs)
+        save_genres([self])
+
+
+def save_genres(films: Iterable[Film]) -> None:
+    """
+    Replace the genres of saved films with those fetched from TMDB.
+
+    Works in bulk so that films inserted with bulk_create, which have no
+    primary key on SQLite, can be linked to their genres in a few queries.
+    """
+    fetched = [film for film in films if hasattr(film, 'tmdb_genres')]
+    if not fetched:
+        return
+
+    genres = {genre['id']: genre['name'] for film in fetched for genre in film.tmdb_genres}
+    Genre.objects.bulk_create([Genre(id=genre_id, name=name) for genre_id, name in genres.items()],
+                              ignore_conflicts=True)
+
+    film_ids = {(tenant_id, tmdb_id): film_id for tenant_id, tmdb_id, film_id in Film.objects.filter(
+        tenant__in={film.tenant_id for film in fetched}, tmdb_id__in=[film.tmdb_id for film in fetched]
+    ).values_list('tenant_id', 'tmdb_id', 'id')}
+    through = Film.genres.through
+    through.objects.filter(film_id__in=film_ids.values()).delete()
+    through.objects.bulk_create([
+        through(film_id=film_ids[film.tenant_id, film.tmdb_id], genre_id=genre['id'])
+        for film in fetched if (film.tenant_id, film.tmdb_id) in film_ids
+        for genre in film.tmdb_genres
+    ], ignore_conflicts=True)
+    Film.bump_version(*(film.tenant_id for film in fetched))
+
+
+def default_next_filmnight() -> datetime.datetime:
+    """Return when a new tenant's first filmnight is: 8pm a week from today."""
+    return (datetime.datetime.now() + datetime.timedelta(days=7)).replace(hour=20, minute=0, second=0, microsecond=0)
 
 
 class FilmConfig(models.Model):
-    """Dynamic settings regarding how the shortlist works."""
+    """A tenant's dynamic settings, including the weekly schedule that recurring filmnights are created from."""
 
     class Phase(Enum):
         FILMNIGHT = 0
         VOTING = 1
         SUBMISSIONS = 2
 
+    tenant = models.OneToOneField(Tenant, on_delete=models.CASCADE, related_name='config')
     name = models.CharField(max_length=80, default='Philmnight')
 
     logo: models.ImageField  # FIXME: Temporary fix until move away from storing icon in DB
-    logo = models.ImageField(upload_to='config/', default='logo/default.png')
-    logo_favicon = models.ImageField(upload_to='logo/', blank=True, null=True)
+    logo = models.ImageField(upload_to='config/', default='logo/logo.png')
+    # Content hash of the logo its derivatives were rendered from
+    logo_hash = models.CharField(max_length=16, blank=True, editable=False)
+    # Set when the logo changes; run_film_worker then renders its derivatives
+    logo_pending = models.BooleanField(default=False, editable=False)
 
-    shortlist = models.ManyToManyField(Film, blank=True)
     shortlist_length = models.IntegerField(default=8)
-    last_shortlist = models.DateTimeField()
     stylesheet = models.FileField(upload_to='config/', default='config/stylesheet.css')
 
-    next_filmnight = models.DateTimeField()
-    filmnight_timedelta = models.DurationField()
-    voting_length = models.DurationField()
-
-    def get_phase(self) -> FilmConfig.Phase:
-        """Return the current phase of voting."""
-        current_time = timezone.now()
+    # New tenants start on a weekly schedule, so their config can be created on first use
+    next_filmnight = models.DateTimeField(default=default_next_filmnight)
+    filmnight_timedelta = models.DurationField(default=datetime.timedelta(days=7))
+    voting_length = models.DurationField(default=datetime.timedelta(days=1))
 
-        if current_time > self.next_filmnight:
-            if current_time > self.next_filmnight + datetime.timedelta(days=1):
-                while current_time > self.next_filmnight + datetime.timedelta(days=1):
-                    self.next_filmnight += self.filmnight_timedelta
+    # How long a filmnight lasts before the schedule moves on to the next one
+    FILMNIGHT_LENGTH = datetime.timedelta(days=1)
 
-                self.save()
-                return self.get_phase()
+    _schedule: Optional[tuple[FilmConfig.Phase, datetime.datetime, datetime.datetime]] = None
 
-            return FilmConfig.Phase.FILMNIGHT
+    def schedule(self, now: Optional[datetime.datetime] = None
+                 ) -> tuple[FilmConfig.Phase, datetime.datetime, datetime.datetime]:
+        """
+        Return the current phase, the filmnight it belongs to and when the phase ends.
 
-        if current_time > self.next_filmnight - self.voting_length:
-            return FilmConfig.Phase.VOTING
+        Missed filmnights are skipped arithmetically rather than stepped through,
+        and nothing is saved; run_scheduler persists the advanced date and
+        creates the Filmnight. The result is cached on the instance until the
+        phase ends.
+        """
+        current_time = now or timezone.now()
+        if now is None and self._schedule is not None and current_time < self._schedule[2]:
+            return self._schedule
+
+        filmnight = self.next_filmnight
+        overdue = current_time - (filmnight + self.FILMNIGHT_LENGTH)
+        if overdue > datetime.timedelta(0):
+            filmnight += -(-overdue // self.filmnight_timedelta) * self.filmnight_timedelta
+
+        if current_time > filmnight:
+            phase, ends = FilmConfig.Phase.FILMNIGHT, filmnight + self.FILMNIGHT_LENGTH
+        elif current_time > filmnight - self.voting_length:
+            phase, ends = FilmConfig.Phase.VOTING, filmnight
+        else:
+            phase, ends = FilmConfig.Phase.SUBMISSIONS, filmnight - self.voting_length
+
+        if now is None:
+            self._schedule = (phase, filmnight, ends)
+        return phase, filmnight, ends
+
+    @staticmethod
+    def cache_version(tenant_id: int) -> str:
+        """Return the token identifying the current version of a tenant's config."""
+        return cache_version(f'{CONFIG_VERSION_KEY}:{tenant_id}')
+
+    @staticmethod
+    def bump_version(tenant_id: int) -> None:
+        """Make every worker reload a tenant's config."""
+        bump_cache_version(f'{CONFIG_VERSION_KEY}:{tenant_id}')
+
+    def schedule_filmnight(self, now: Optional[datetime.datetime] = None) -> Optional[Filmnight]:
+        """
+        Create the recurring Filmnight for the current point in the schedule, if it does not exist yet.
 
-        return FilmConfig.Phase.SUBMISSIONS
+        An upcoming recurring filmnight whose shortlist has not been drawn
+        is moved to match the schedule instead, so changes to the config
+        apply to it. Returns the filmnight if one was created or moved.
+        """
+        now = now or timezone.now()
+        _, starts, _ = self.schedule(now)
+        times = {
+            'voting_opens': starts - self.voting_length,
+            'starts': starts,
+            'ends': starts + self.FILMNIGHT_LENGTH,
+        }
+
+        filmnight = Filmnight.objects.filter(
+            tenant=self.tenant_id, recurring=True, ends__gt=now
+        ).order_by('starts').first()
+        if filmnight is None:
+            return Filmnight.objects.create(tenant_id=self.tenant_id, recurring=True,
+                                            shortlist_length=self.shortlist_length, **times)
+        if filmnight.shortlist_drawn is not None or all(
+                getattr(filmnight, name) == value for name, value in times.items()):
+            return None
+
+        for name, value in times.items():
+            setattr(filmnight, name, value)
+        filmnight.shortlist_length = self.shortlist_length
+        filmnight.save()
+        return filmnight
 
     def __str__(self) -> str:
         """Return string representation of film config."""
         return self.name
 
+    def logo_url(self, name: str) -> Optional[str]:
+        """Return the URL of a logo derivative, or None if none have been rendered yet."""
+        if not self.logo_hash:
+            return None
+        return default_storage.url(derivative_path(self.logo_hash, name))
+
+    def update_logo_derivatives(self, force: bool = False) -> bool:
+        """
+        Render derivatives of the logo if its content has changed. Return whether it had.
+
+        A missing logo file is logged and left unrendered, so the static logo
+        is shown instead. Either way the logo is no longer pending, unless it
+        was changed again in the meantime.
+        """
+        rendered = False
+        try:
+            with self.logo.open('rb') as source:
+                data = source.read()
+        except FileNotFoundError:
+            logger.warning('Logo %s of tenant %s does not exist', self.logo.name, self.tenant_id)
+        else:
+            digest = content_hash(data)
+            if digest != self.logo_hash or force:
+                render_logo_derivatives(BytesIO(data), digest)
+                self.logo_hash = digest
+                rendered = True
+
+        if rendered or self.logo_pending:
+            self.logo_pending = False
+            FilmConfig.objects.filter(id=self.id, logo=self.logo.name).update(logo_hash=self.logo_hash,
+                                                                            logo_pending=False)
+            FilmConfig.bump_version(self.tenant_id)
+        return rendered
+
     # pylint: disable=signature-differs
     def save(self, *args: Any, **kwargs: Any) -> None:
-        """Override save method of config to automatically resize images."""
-        if FilmConfig.objects.filter(id=1).exists() and self.id != 1:
-            raise IntegrityError('Only one instance of FilmConfig may exist in the database')
-
-        self.id = 1  # pylint: disable=all
+        """Override save method of config to queue rendering of logo derivatives when the logo changes."""
+        previous = FilmConfig.objects.filter(tenant=self.tenant_id).values_list('id', 'logo').first()
+        if previous is not None and self.id != previous[0]:
+            raise IntegrityError('Only one instance of FilmConfig may exist for each tenant')
 
-        image = Image.open(self.logo)
-        image.save('media/logo/logo.png', format='png')
-        image = image.resize((32, 32), Image.ANTIALIAS)
-        image.save('media/logo/favicon.png', format='png')
-        self.logo_favicon = 'logo/favicon.png'
-        self.logo = 'logo/logo.png'
+        self._schedule = None
+        if previous is None or previous[1] != self.logo.name:
+            # The static logo is shown until run_film_worker has rendered the new one
+            self.logo_hash = ''
+            self.logo_pending = True
 
         super(FilmConfig, self).save(*args, **kwargs)
+        FilmConfig.bump_version(self.tenant_id)
+
+
+class FilmnightQuerySet(models.QuerySet):
+    """Queryset helpers for filmnights."""
+
+    def current(self, now: Optional[datetime.datetime] = None) -> Optional[Filmnight]:
+        """
+        Return the filmnight in progress or coming up next, if any is scheduled.
+
+        A single query. Called on a tenant's filmnights, it only reads those
+        that have not ended through the index on (tenant, ends), however many
+        past ones there are. When filmnights overlap, the one starting first
+        is current.
+        """
+        return self.filter(ends__gt=now or timezone.now()).order_by('starts', 'id').first()
+
+
+class Filmnight(models.Model):
+    """
+    A single filmnight with its own schedule, shortlist and votes.
+
+    Recurring filmnights are created by run_scheduler from the config's
+    schedule; one-off filmnights can be added in the admin.
+    """
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='filmnights')
+    name = models.CharField(max_length=80, blank=True)
+    voting_opens = models.DateTimeField()
+    starts = models.DateTimeField()
+    ends = models.DateTimeField()
+    recurring = models.BooleanField(default=False)
+
+    shortlist = models.ManyToManyField(Film, blank=True, related_name='filmnights')
+    shortlist_length = models.IntegerField(default=8)
+    # Set when the shortlist is drawn, so that it is only drawn once
+    shortlist_drawn = models.DateTimeField(blank=True, null=True)
+    # Set once voting has closed and the winner, if there were any votes, was marked watched
+    closed = models.BooleanField(default=False)
+    winner = models.ForeignKey(Film, blank=True, null=True, on_delete=models.SET_NULL, related_name='+')
+
+    objects = FilmnightQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['starts']
+        indexes = [
+            # Finds a tenant's current filmnight without reading past ones
+            models.Index(fields=['tenant', 'ends'], name='filmnight_tenant_ends_idx'),
+            # Finds filmnights of every tenant that run_scheduler has work due for
+            models.Index(fields=['ends'], name='filmnight_ends_idx'),
+            # Finds filmnights that are waiting for run_scheduler to close them
+            models.Index(fields=['starts'], condition=models.Q(closed=False), name='filmnight_open_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """Return a string representation of the filmnight."""
+        return self.name or f'Filmnight on {self.starts:%Y-%m-%d %H:%M}'
+
+    def schedule(self, now: Optional[datetime.datetime] = None) -> tuple[FilmConfig.Phase, datetime.datetime]:
+        """Return the filmnight's phase and when that phase ends."""
+        now = now or timezone.now()
+        if now > self.starts:
+            return FilmConfig.Phase.FILMNIGHT, self.ends
+        if now > self.voting_opens:
+            return FilmConfig.Phase.VOTING, self.starts
+        return FilmConfig.Phase.SUBMISSIONS, self.voting_opens
+
+    def get_phase(self, now: Optional[datetime.datetime] = None) -> FilmConfig.Phase:
+        """Return the filmnight's phase."""
+        return self.schedule(now)[0]
+
+    @staticmethod
+    def cache_version(tenant_id: int) -> str:
+        """Return the token identifying the current version of a tenant's filmnights."""
+        return cache_version(f'{FILMNIGHTS_VERSION_KEY}:{tenant_id}')
+
+    @staticmethod
+    def bump_version(tenant_id: int) -> None:
+        """Make every worker look up a tenant's current filmnight again."""
+        bump_cache_version(f'{FILMNIGHTS_VERSION_KEY}:{tenant_id}')
+
+
+class Vote(models.Model):
+    """A single user's vote for a shortlisted film on a given filmnight."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    film = models.ForeignKey(Film, on_delete=models.CASCADE)
+    filmnight = models.ForeignKey(Filmnight, on_delete=models.CASCADE, related_name='votes')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'filmnight', 'film'], name='unique_vote'),
+        ]
+        indexes = [
+            models.Index(fields=['filmnight', 'film'], name='vote_filmnight_film_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """Return a string representation of the vote."""
+        return f'{self.user} -> {self.film}'
+
+
+class SubmissionJob(models.Model):
+    """A queued request to add a film to a tenant's watchlist, processed by run_film_worker."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='+')
+    tmdb_id = models.IntegerField()
+    user = models.ForeignKey(User, blank=True, null=True, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    message = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created'], name='job_status_created_idx'),
+            models.Index(fields=['user', '-created'], name='job_user_created_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """Return a string representation of the job."""
+        return f'{self.tmdb_id} ({self.status})'
+
+    @staticmethod
+    def claim() -> Optional[SubmissionJob]:
+        """Mark the oldest pending job as running and return it, or None if there are none."""
+        while True:
+            job = SubmissionJob.objects.filter(
+                status=SubmissionJob.Status.PENDING
+            ).order_by('created').first()
+            if job is None:
+                return None
+
+            # Only one worker wins the compare-and-swap on status
+            if SubmissionJob.objects.filter(pk=job.pk, status=SubmissionJob.Status.PENDING).update(
+                    status=SubmissionJob.Status.RUNNING, updated=timezone.now()):
+                job.status = SubmissionJob.Status.RUNNING
+                return job
+
+    def run(self) -> None:
+        """Add the film to the watchlist and record the outcome."""
+        if Film.objects.filter(tenant=self.tenant_id, tmdb_id=self.tmdb_id).exists():
+            self.finish(SubmissionJob.Status.FAILED, 'Film already exists in database.')
+            return
+
+        try:
+            Film.objects.create(tenant_id=self.tenant_id, tmdb_id=self.tmdb_id, submitting_user=self.user)
+        except UnreleasedFilmError:
+            self.finish(SubmissionJob.Status.FAILED, 'Film has not been released yet.')
+        except IntegrityError:
+            self.finish(SubmissionJob.Status.FAILED, 'Film already exists in database.')
+        except FilmNotFound:
+            self.finish(SubmissionJob.Status.FAILED, 'Film could not be found on TMDB.')
+        except TMDBError:
+            self.finish(SubmissionJob.Status.FAILED, 'Could not fetch film details from TMDB.')
+        except Exception:  # pylint: disable=broad-except
+            # Anything else is a bug, but it must not leave the job running forever
+            logger.exception('Submission job %s for film %s failed', self.pk, self.tmdb_id)
+            self.finish(SubmissionJob.Status.FAILED, 'Could not add the film.')
+        else:
+            self.finish(SubmissionJob.Status.DONE, 'Successfully added film')
+
+    def finish(self, status: str, message: str) -> None:
+        """Record the final status of the job."""
+        self.status = status
+        self.message = message
+        self.save(update_fields=['status', 'message', 'updated'])
+
+
+class CatalogueEntry(models.Model):
+    """A film from TMDB's daily ID export, used to search titles without calling TMDB."""
+
+    tmdb_id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    search_title = models.CharField(max_length=255, db_index=True)
+    popularity = models.FloatField(default=0)
+    imported = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-popularity'], name='catalogue_popularity_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """Return a string representation of the catalogue entry."""
+        return self.title
+
+    def words(self) -> list[CatalogueWord]:
+        """Return unsaved rows indexing the entry's search title from each word after the first."""
+        words = self.search_title.split(' ')
+        return [
+            CatalogueWord(entry_id=self.tmdb_id, suffix=' '.join(words[start:]), popularity=self.popularity)
+            for start in range(1, len(words))
+        ]
+
+
+class CatalogueWord(models.Model):
+    """
+    A catalogue entry's search title from one of its words onwards.
+
+    A range lookup on `suffix` finds titles with a word starting with the
+    query through an index, where a substring match would read every
+    title. Popularity is copied from the entry so matches are ranked
+    without a join.
+    """
+
+    entry = models.ForeignKey(CatalogueEntry, on_delete=models.CASCADE, related_name='+')
+    suffix = models.CharField(max_length=255)
+    popularity = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['suffix'], name='catalogue_word_suffix_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """Return a string representation of the catalogue word."""
+        return self.suffix
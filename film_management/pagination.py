@@ -0,0 +1,78 @@
+"""Keyset (cursor) pagination over querysets."""
+import base64
+import binascii
+import json
+from typing import Any, Optional
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Model, Q, QuerySet
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded."""
+
+
+def encode_cursor(value: Any, pk: int) -> str:
+    """Return an opaque cursor pointing after a row with the given sort value and primary key."""
+    data = json.dumps([None if value is None else str(value), pk]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(model: type[Model], field: str, cursor: str) -> tuple[Any, int]:
+    """Return the sort value, converted back to the field's type, and primary key in a cursor."""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if value is not None:
+            value = model._meta.get_field(field).to_python(value)
+        return value, int(pk)
+    except (binascii.Error, ValidationError, ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def after(field: str, value: Any, pk: int, descending: bool, nullable: bool) -> Q:
+    """
+    Return a filter for the rows that follow (`value`, `pk`) in keyset order.
+
+    NULL sorts before every value, so it comes first in ascending order
+    and last in descending order, on every database.
+    """
+    if value is None:
+        if descending:
+            return Q(**{f'{field}__isnull': True, 'pk__lt': pk})
+        return Q(**{f'{field}__isnull': True, 'pk__gt': pk}) | Q(**{f'{field}__isnull': False})
+
+    lookup, pk_lookup = ('lt', 'pk__lt') if descending else ('gt', 'pk__gt')
+    condition = Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, pk_lookup: pk})
+    if descending and nullable:
+        condition |= Q(**{f'{field}__isnull': True})
+    return condition
+
+
+def paginate(queryset: QuerySet, sort: str, cursor: Optional[str],
+             size: int) -> tuple[list[Model], Optional[str]]:
+    """
+    Return a page of `queryset` and the cursor of the next page, if there is one.
+
+    Rows are ordered by `sort` (prefix with - to descend) and then primary
+    key, and start after `cursor`. Only `size + 1` rows are fetched, however
+    deep the page, and the ordering matches an index on (sort, id).
+    """
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    nullable = queryset.model._meta.get_field(field).null
+    if not nullable:
+        queryset = queryset.order_by(sort, '-pk' if descending else 'pk')
+    elif descending:
+        queryset = queryset.order_by(F(field).desc(nulls_last=True), '-pk')
+    else:
+        queryset = queryset.order_by(F(field).asc(nulls_first=True), 'pk')
+
+    if cursor:
+        value, pk = decode_cursor(queryset.model, field, cursor)
+        queryset = queryset.filter(after(field, value, pk, descending, nullable))
+
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    last = rows[size - 1]
+    return rows[:size], encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,151 @@
+"""Film title search for the submission autocomplete."""
+from __future__ import annotations
+from collections import OrderedDict
+import datetime
+import threading
+import time
+from typing import Any, Optional
+
+from .models import CatalogueEntry, CatalogueWord, Film
+from .tmdb import get_client
+
+SEARCH_RESULTS = 5
+# Shorter queries only match the start of titles
+MIN_WORD_QUERY = 3
+
+
+def normalize(query: str) -> str:
+    """Return a query lower-cased with runs of whitespace collapsed."""
+    return ' '.join(query.lower().split())
+
+
+class SearchCache:
+    """
+    In-process LRU cache of catalogue and TMDB search results with a TTL.
+
+    When a search returned every match for a query, on TMDB's first page or
+    from the catalogue, the result is complete, so a longer query starting
+    with it is answered by filtering those results locally instead of
+    searching again.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 600) -> None:
+        """Create a cache of up to `max_size` searches, each kept for `ttl` seconds."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, list[dict[str, Any]], bool]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, query: str) -> Optional[tuple[list[dict[str, Any]], bool]]:
+        entry = self._entries.get(query)
+        if entry is None:
+            return None
+        stored, results, complete = entry
+        if time.monotonic() - stored > self.ttl:
+            del self._entries[query]
+            return None
+        self._entries.move_to_end(query)
+        return results, complete
+
+    def get(self, query: str) -> Optional[list[dict[str, Any]]]:
+        """Return cached results for a normalized query, reusing complete prefixes."""
+        with self._lock:
+            entry = self._lookup(query)
+            if entry is not None:
+                return entry[0]
+
+            for end in range(len(query) - 1, 0, -1):
+                entry = self._lookup(query[:end])
+                if entry is not None and entry[1]:
+                    results = [result for result in entry[0] if query in normalize(result['title'])]
+                    self._store(query, results, True)
+                    return results
+        return None
+
+    def put(self, query: str, results: list[dict[str, Any]], complete: bool) -> None:
+        """Store results for a normalized query."""
+        with self._lock:
+            self._store(query, results, complete)
+
+    def clear(self) -> None:
+        """Remove every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, query: str, results: list[dict[str, Any]], complete: bool) -> None:
+        self._entries[query] = (time.monotonic(), results, complete)
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+SEARCH_CACHE = SearchCache()
+
+
+def search_catalogue(query: str) -> list[dict[str, Any]]:
+    """
+    Search the local TMDB catalogue, ranked by popularity.
+
+    Title prefix matches come first and use the index on `search_title`
+    through a range lookup. Titles with a later word starting with the
+    query fill any remaining slots, found the same way through the index
+    on CatalogueWord, so no lookup reads the whole catalogue.
+    """
+    entries = CatalogueEntry.objects.order_by('-popularity').values_list('tmdb_id', 'title')
+    matches = dict(entries.filter(
+        search_title__gte=query, search_title__lt=query + '\uffff'
+    )[:SEARCH_RESULTS])
+
+    if len(matches) < SEARCH_RESULTS and len(query) >= MIN_WORD_QUERY:
+        words = CatalogueWord.objects.filter(
+            suffix__gte=query, suffix__lt=query + '\uffff'
+        ).exclude(entry__in=list(matches)).order_by('-popularity').values_list('entry_id', 'entry__title')
+        # A title can have several matching words, so read enough to fill the slots regardless
+        for tmdb_id, title in words[:SEARCH_RESULTS * 2]:
+            if len(matches) < SEARCH_RESULTS:
+                matches.setdefault(tmdb_id, title)
+
+    return [{'id': tmdb_id, 'title': title} for tmdb_id, title in matches.items()]
+
+
+def search_tmdb(query: str) -> list[dict[str, Any]]:
+    """Search TMDB for a normalized query and cache the results."""
+    page = get_client().get('search/movie', query=query)
+    results = page['results']
+    SEARCH_CACHE.put(query, results, page.get('total_results', 0) <= len(results))
+    return results
+
+
+def find_films(query: str, tenant_id: int) -> list[list[Any]]:
+    """
+    Return autocomplete entries for a search query made by a tenant's user.
+
+    Results come from the local catalogue when it has matches, otherwise
+    from TMDB. Each entry is `[label, tmdb_id, disabled]`, where disabled
+    films are on the tenant's watchlist already or are not yet released. Catalogue
+    entries carry no release date, so unreleased films are only rejected
+    on submission.
+    """
+    query = normalize(query)
+    results = SEARCH_CACHE.get(query)
+    if results is None:
+        results = search_catalogue(query)
+        if results:
+            # Fewer results than asked for are every match, once words are searched too
+            SEARCH_CACHE.put(query, results, len(results) < SEARCH_RESULTS and len(query) >= MIN_WORD_QUERY)
+        else:
+            results = search_tmdb(query)
+
+    results = results[:SEARCH_RESULTS]
+    submitted = set(Film.objects.filter(
+        tenant=tenant_id, tmdb_id__in=[result['id'] for result in results]
+    ).values_list('tmdb_id', flat=True))
+    today = datetime.date.today().isoformat()
+
+    potential_films = []
+    for result in results:
+        release_date = result.get('release_date') or ''
+        disabled = result['id'] in submitted or release_date > today
+        label = result['title'] + (' (' + release_date[:4] + ')' if release_date else '')
+        potential_films.append([label, result['id'], disabled])
+    return potential_films
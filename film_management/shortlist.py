@@ -0,0 +1,107 @@
+"""Random selection of films for the voting shortlist."""
+import datetime
+import heapq
+import random
+from typing import Any, Callable, Iterable, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Film, Filmnight
+from .tally import VoteTally, choose_winner
+
+
+def age_weight(date_submitted: datetime.datetime) -> float:
+    """Favour films that have been waiting on the watchlist for longer."""
+    return max((datetime.datetime.now() - date_submitted).days, 0) + 1
+
+
+def score_weight(score: Any) -> float:
+    """Favour films with a higher TMDB score; unscored films count as 0."""
+    return max(float(score or 0), 0) + 1
+
+
+WEIGHTS: dict[str, tuple[str, Callable[[Any], float]]] = {
+    'age': ('date_submitted', age_weight),
+    'score': ('score', score_weight),
+}
+
+
+def sample_shortlist(tenant_id: int, size: int, weight: Optional[str] = None,
+                     genres: Optional[Iterable[int]] = None,
+                     seed: Optional[int] = None) -> list[int]:
+    """
+    Return the ids of up to `size` of a tenant's unwatched films, drawn without replacement.
+
+    Only the id column (plus the weighted column, if any) is loaded, in a
+    single query. Weighted draws use Efraimidis-Spirakis keys, so they also
+    take a single pass over the candidates. Restricting to `genres` keeps
+    films in any of the given genre ids. Passing `seed` makes the draw
+    reproducible for the same set of films.
+    """
+    rng = random.Random(seed)
+    films = Film.objects.filter(tenant=tenant_id, watched=False).order_by('id')
+    if genres is not None:
+        films = films.filter(genres__in=list(genres)).distinct()
+
+    if weight is None:
+        ids = list(films.values_list('id', flat=True))
+        return rng.sample(ids, min(size, len(ids)))
+
+    field, weight_function = WEIGHTS[weight]
+    keyed = (
+        (rng.random() ** (1 / weight_function(value)), film_id)
+        for film_id, value in films.values_list('id', field)
+    )
+    return [film_id for _, film_id in heapq.nlargest(size, keyed)]
+
+
+def draw_shortlist(filmnight: Filmnight) -> bool:
+    """
+    Draw a filmnight's shortlist, unless it has already been drawn. Return whether this call drew it.
+
+    `shortlist_drawn` is set with a compare-and-swap at the start of the
+    transaction, so concurrent callers block on the row until the first
+    commits and then find nothing to do.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        claimed = Filmnight.objects.filter(id=filmnight.id, shortlist_drawn__isnull=True).update(
+            shortlist_drawn=now
+        )
+        if not claimed:
+            filmnight.refresh_from_db(fields=['shortlist_drawn'])
+            return False
+
+        filmnight.shortlist.set(sample_shortlist(filmnight.tenant_id, filmnight.shortlist_length))
+        filmnight.shortlist_drawn = now
+        Filmnight.bump_version(filmnight.tenant_id)
+
+    VoteTally(filmnight).rebuild()
+    return True
+
+
+def close_filmnight(filmnight: Filmnight) -> Optional[Film]:
+    """
+    Record a filmnight's winner once voting has closed and mark it watched.
+
+    Like draw_shortlist, the filmnight is claimed with a compare-and-swap,
+    so each is closed once. Returns the winner, or None if there were no
+    votes or the filmnight was already closed.
+    """
+    with transaction.atomic():
+        if not Filmnight.objects.filter(id=filmnight.id, closed=False).update(closed=True):
+            return None
+        filmnight.closed = True
+
+        shortlist = {film.id: film for film in filmnight.shortlist.with_votes(filmnight)}
+        winner_id = choose_winner({film_id: film.vote_count for film_id, film in shortlist.items()})
+        winner = shortlist[winner_id] if winner_id is not None else None
+        if winner is not None:
+            Filmnight.objects.filter(id=filmnight.id).update(winner=winner)
+            filmnight.winner = winner
+            Film.objects.filter(id=winner.id).update(watched=True)
+            Film.bump_version(filmnight.tenant_id)
+        Filmnight.bump_version(filmnight.tenant_id)
+    return winner
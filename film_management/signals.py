@@ -0,0 +1,46 @@
+"""Signal handlers keeping cached film pages in step with the database."""
+from typing import Any, Optional
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Film, Filmnight
+from .tally import VoteTally
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+def invalidate_film_pages(instance: Film, **kwargs: Any) -> None:
+    """Invalidate the tenant's cached watchlist and film pages when a film changes."""
+    Film.bump_version(instance.tenant_id)
+
+
+@receiver(m2m_changed, sender=Film.genres.through)
+def invalidate_film_genres(action: str, instance: object, reverse: bool, pk_set: Optional[set[int]],
+                           **kwargs: Any) -> None:
+    """Invalidate cached watchlist and film pages when a film's genres change."""
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Film):
+        Film.bump_version(instance.tenant_id)
+    elif reverse:
+        Film.bump_version(*Film.objects.filter(pk__in=pk_set or ()).values_list('tenant_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Filmnight)
+@receiver(post_delete, sender=Filmnight)
+def invalidate_filmnight(instance: Filmnight, **kwargs: Any) -> None:
+    """Make workers look up the tenant's current filmnight again when one changes, e.g. in the admin."""
+    Filmnight.bump_version(instance.tenant_id)
+
+
+@receiver(m2m_changed, sender=Filmnight.shortlist.through)
+def rebuild_tally(action: str, instance: object, reverse: bool, pk_set: Optional[set[int]],
+                  **kwargs: Any) -> None:
+    """Recount votes when films are added to or removed from a shortlist, e.g. in the admin."""
+    if not action.startswith('post_'):
+        return
+    filmnights = Filmnight.objects.filter(pk__in=pk_set or ()) if reverse else [instance]
+    for filmnight in filmnights:
+        if isinstance(filmnight, Filmnight):
+            VoteTally(filmnight).rebuild()
@@ -0,0 +1,141 @@
+"""Incrementally maintained vote tallies for the current shortlist."""
+from __future__ import annotations
+from contextlib import contextmanager
+import time
+from typing import Iterable, Iterator, Optional
+
+from django.core.cache import cache
+
+from .models import Filmnight
+
+TALLY_TIMEOUT = 60 * 60 * 24 * 14
+# A user's vote submissions wait for their previous one for this long at most, checking this often
+VOTE_LOCK_TIMEOUT = 10
+VOTE_LOCK_POLL = 0.02
+
+
+def choose_winner(counts: dict[int, int]) -> Optional[int]:
+    """
+    Return the film with the most votes from counts keyed by film id, or None if nobody has voted.
+
+    Ties go to the film with the lowest id, i.e. the one added first. Both
+    the live leader and the recorded winner are chosen here, so they agree.
+    """
+    voted = [(-count, film_id) for film_id, count in counts.items() if count > 0]
+    return min(voted)[1] if voted else None
+
+
+class VoteTally:
+    """
+    Vote counts for a filmnight's shortlist, held in the Django cache.
+
+    Counts are keyed by TMDB id and adjusted by delta as votes are submitted,
+    so reading them never touches the database. They are rebuilt with a
+    single aggregate query when the shortlist changes or the cache entries
+    have been evicted. Reads and the leader lookup cost O(shortlist_length),
+    independent of the number of users and films. The shortlist itself is
+    cached alongside the counts, so votes can be validated without a query.
+
+    Every change also advances a sequence number, which serves as a change
+    feed: watchers poll that single key and only read the counts when it
+    has moved.
+    """
+
+    def __init__(self, filmnight: Filmnight) -> None:
+        """Create the tally of a filmnight's votes."""
+        self.filmnight = filmnight
+        self.prefix = f'tally:{filmnight.pk}'
+
+    def _key(self, tmdb_id: int) -> str:
+        return f'{self.prefix}:{tmdb_id}'
+
+    def _advance(self) -> None:
+        try:
+            cache.incr(self.prefix + ':seq')
+        except ValueError:
+            # Start from the clock, so a watcher never sees an evicted sequence repeat
+            cache.set(self.prefix + ':seq', int(time.time() * 1000), TALLY_TIMEOUT)
+
+    def sequence(self) -> Optional[int]:
+        """Return a number that changes whenever the counts do, or None if it was evicted."""
+        return cache.get(self.prefix + ':seq')
+
+    def _rebuild(self) -> tuple[dict[int, int], dict[int, int]]:
+        rows = list(self.filmnight.shortlist.with_votes(self.filmnight).values_list(
+            'tmdb_id', 'id', 'vote_count'
+        ))
+        shortlist = {tmdb_id: film_id for tmdb_id, film_id, _ in rows}
+        counts = {tmdb_id: count for tmdb_id, _, count in rows}
+        values: dict[str, object] = {self._key(tmdb_id): count for tmdb_id, count in counts.items()}
+        values[self.prefix] = shortlist
+        cache.set_many(values, TALLY_TIMEOUT)
+        self._advance()
+        return shortlist, counts
+
+    def rebuild(self) -> dict[int, int]:
+        """Recount votes for the shortlist from the database and store them."""
+        return self._rebuild()[1]
+
+    def shortlist(self) -> dict[int, int]:
+        """Return the database ids of the shortlisted films keyed by TMDB id."""
+        shortlist: Optional[dict[int, int]] = cache.get(self.prefix)
+        if shortlist is None:
+            shortlist = self._rebuild()[0]
+        return shortlist
+
+    def counts(self) -> dict[int, int]:
+        """Return current vote counts keyed by TMDB id."""
+        shortlist: Optional[dict[int, int]] = cache.get(self.prefix)
+        if shortlist is None:
+            return self.rebuild()
+
+        keys = {self._key(tmdb_id): tmdb_id for tmdb_id in shortlist}
+        values = cache.get_many(keys)
+        if len(values) != len(keys):
+            return self.rebuild()
+        return {keys[key]: count for key, count in values.items()}
+
+    def leader(self) -> Optional[int]:
+        """Return the TMDB id of the film with the most votes, or None if nobody has voted."""
+        counts, shortlist = self.counts(), self.shortlist()
+        tmdb_ids = {film_id: tmdb_id for tmdb_id, film_id in shortlist.items()}
+        film_id = choose_winner({
+            shortlist[tmdb_id]: count for tmdb_id, count in counts.items() if tmdb_id in shortlist
+        })
+        return tmdb_ids[film_id] if film_id is not None else None
+
+    @contextmanager
+    def voting(self, user_id: int) -> Iterator[None]:
+        """
+        Hold a lock on one user's votes while they are read and written.
+
+        Votes only conflict with the same user's votes, so serialising each
+        user's submissions means the additions and removals computed from
+        the votes read are exactly the rows inserted and deleted. A repeated
+        submission then finds its films already voted for, rather than
+        counting a row that was dropped as a duplicate. The lock expires by
+        itself if its holder dies.
+        """
+        key = f'{self.prefix}:lock:{user_id}'
+        while not cache.add(key, True, VOTE_LOCK_TIMEOUT):
+            time.sleep(VOTE_LOCK_POLL)
+        try:
+            yield
+        finally:
+            cache.delete(key)
+
+    def apply(self, added: Iterable[int], removed: Iterable[int]) -> None:
+        """Adjust counts after votes have been written to the database, while holding the voter's lock."""
+        added, removed = list(added), list(removed)
+        if not added and not removed:
+            return
+        try:
+            for tmdb_id in added:
+                cache.incr(self._key(tmdb_id))
+            for tmdb_id in removed:
+                cache.decr(self._key(tmdb_id))
+        except ValueError:
+            # An entry was evicted; the database already holds the new votes
+            self.rebuild()
+        else:
+            self._advance()
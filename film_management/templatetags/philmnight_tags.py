@@ -1,34 +1,89 @@
-"""Custom template tags for philmnight branding."""
+"""Custom template tags for philmnight branding and film images."""
+from typing import Any, Callable, Optional, Sequence
+
 from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
 from django.utils.safestring import SafeString, mark_safe
 
+from film_management.images import FILM_IMAGE_FORMATS, FILM_IMAGES, LOGO_FORMATS, LOGO_WIDTHS
+from film_management.models import Film
 from film_management.views import get_config
 
 register = template.Library()
-FILM_CONFIG = get_config()
 
+# Posters are shown 100px wide in the watchlist and on the voting page
+POSTER_SIZES = '100px'
 
-@register.simple_tag
-def philmnight_name() -> str:
-    """Return the name of the philmnight app."""
-    assert FILM_CONFIG is not None
-    return FILM_CONFIG.name
 
+@register.simple_tag(takes_context=True)
+def philmnight_name(context: dict[str, Any]) -> str:
+    """Return the name of the tenant's philmnight app."""
+    film_config = get_config(context['tenant'])
+    assert film_config is not None
+    return film_config.name
 
-@register.simple_tag
-def philmnight_logo() -> SafeString:
-    """Return logo of the philmnight app."""
-    assert FILM_CONFIG is not None
-    return mark_safe('<img id="logo" src="' + FILM_CONFIG.logo.url + '">')
 
+def picture(attributes: str, url: Callable[[int, str], Optional[str]], widths: Sequence[int],
+            formats: Sequence[str], fallback: str, sizes: str) -> SafeString:
+    """Return a <picture> offering each width in each format, with `fallback` for the <img>."""
+
+    def srcset(image_format: str) -> str:
+        return ', '.join(f'{url(width, image_format)} {width}w' for width in widths)
+
+    sources = mark_safe(''.join(
+        format_html('<source type="image/{}" srcset="{}" sizes="{}">', image_format, srcset(image_format), sizes)
+        for image_format in formats if image_format != fallback
+    ))
+    return format_html('<picture>{}<img {} src="{}" srcset="{}" sizes="{}"></picture>', sources,
+                       mark_safe(attributes), url(widths[0], fallback), srcset(fallback), sizes)
+
+
+@register.simple_tag(takes_context=True)
+def philmnight_logo(context: dict[str, Any]) -> SafeString:
+    """Return logo of the tenant's philmnight app, with resized and WebP versions once rendered."""
+    film_config = get_config(context['tenant'])
+    assert film_config is not None
+    if not film_config.logo_hash:
+        return format_html('<img id="logo" src="{}">', static('logo.png'))
+
+    return picture('id="logo"', lambda width, image_format: film_config.logo_url(f'logo-{width}.{image_format}'),
+                   LOGO_WIDTHS, LOGO_FORMATS, 'png', f'{LOGO_WIDTHS[0]}px')
 
-@register.simple_tag
-def philmnight_favicon() -> SafeString:
-    """Return logo of the philmnight app in favicon dimensions."""
-    assert FILM_CONFIG is not None
-    return mark_safe('<link rel="icon" type="image/png" href="' + FILM_CONFIG.logo.url + '">')
+
+@register.simple_tag(takes_context=True)
+def philmnight_favicon(context: dict[str, Any]) -> SafeString:
+    """Return links to the favicon and touch icon of the tenant's philmnight app."""
+    film_config = get_config(context['tenant'])
+    assert film_config is not None
+    if not film_config.logo_hash:
+        return format_html('<link rel="icon" type="image/png" href="{}">', static('logo.png'))
+
+    return format_html(
+        '<link rel="icon" type="image/png" sizes="32x32" href="{}">'
+        '<link rel="apple-touch-icon" href="{}">',
+        film_config.logo_url('favicon.png'),
+        film_config.logo_url('apple-touch-icon.png'),
+    )
 
 
 def philmnight_stylesheet():
     """Return ."""
     return False
+
+
+@register.simple_tag
+def film_poster(film: Film) -> SafeString:
+    """Return the locally stored poster thumbnail of a film, or a placeholder."""
+    if film.poster_url() is None:
+        return format_html('<img class="film-image" src="{}" loading="lazy">',
+                           static('images/placeholder_film.png'))
+
+    return picture('class="film-image" loading="lazy"', film.poster_url, FILM_IMAGES['poster'][1],
+                   FILM_IMAGE_FORMATS, 'jpeg', POSTER_SIZES)
+
+
+@register.simple_tag
+def film_backdrop(film: Film) -> str:
+    """Return the URL of the locally stored backdrop of a film, or an empty string."""
+    return film.backdrop_url() or ''
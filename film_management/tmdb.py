@@ -0,0 +1,177 @@
+"""Client for The Movie Database (TMDB) API."""
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.metrics import record_tmdb
+
+# How long a cached movie is kept for revalidation after it stops being fresh
+STALE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class TMDBError(Exception):
+    """Raised when TMDB cannot be reached or returns an error."""
+
+
+class FilmNotFound(TMDBError):
+    """Raised when TMDB has no film with the requested id."""
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls to at most `rate` per second."""
+
+    def __init__(self, rate: float) -> None:
+        """Create a limiter allowing `rate` calls per second."""
+        self.interval = 1 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the caller may make its next call."""
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(self._next, now)
+            self._next = scheduled + self.interval
+        time.sleep(scheduled - now)
+
+
+class TMDBClient:
+    """
+    Pooled TMDB client with timeouts, bounded retries and a movie cache.
+
+    Connections are kept alive in a pool shared by every caller in the
+    process. `movie/{id}` responses are cached for `cache_ttl` seconds and
+    revalidated with `If-None-Match` afterwards. Images are fetched from
+    `image_endpoint`, TMDB's image CDN. Pass `transport` to replace the HTTP
+    adapter, e.g. to point the client at a stub server in tests.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, endpoint: str, key: str, timeout: float = 5, retries: int = 3,
+                 backoff: float = 0.5, cache_ttl: int = 3600, pool_size: int = 10,
+                 transport: Optional[BaseAdapter] = None,
+                 image_endpoint: str = 'https://image.tmdb.org/t/p/') -> None:
+        """Create a client for the TMDB API at `endpoint`, authenticated with `key`."""
+        self.endpoint = endpoint if endpoint.endswith('/') else endpoint + '/'
+        self.image_endpoint = image_endpoint if image_endpoint.endswith('/') else image_endpoint + '/'
+        self.key = key
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+
+        if transport is None:
+            transport = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=Retry(
+                    total=retries,
+                    backoff_factor=backoff,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset({'GET'}),
+                    raise_on_status=False,
+                ),
+            )
+        self.session = requests.Session()
+        self.session.mount('http://', transport)
+        self.session.mount('https://', transport)
+
+    def request(self, path: str, params: Optional[dict[str, Any]] = None,
+                headers: Optional[dict[str, str]] = None) -> requests.Response:
+        """Perform a GET request against the API, raising TMDBError on failure."""
+        return self._get(self.endpoint + path, dict(params or {}, api_key=self.key), headers)
+
+    def _get(self, url: str, params: Optional[dict[str, Any]] = None,
+             headers: Optional[dict[str, str]] = None) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TMDBError(f'Request to TMDB failed: {e}') from e
+        finally:
+            record_tmdb(time.perf_counter() - started)
+
+        if response.status_code == 404:
+            raise FilmNotFound(f'TMDB has no resource at {url}')
+        if response.status_code >= 400:
+            raise TMDBError(f'TMDB returned {response.status_code} for {url}')
+        return response
+
+    def get(self, path: str, **params: Any) -> dict[str, Any]:
+        """Return the decoded JSON body of a GET request."""
+        return self.request(path, params).json()
+
+    def movie(self, tmdb_id: int) -> dict[str, Any]:
+        """Return details for a film, served from cache while fresh."""
+        cache_key = f'tmdb:movie:{tmdb_id}'
+        cached: Optional[dict[str, Any]] = cache.get(cache_key)
+        if cached is not None and time.time() - cached['fetched'] < self.cache_ttl:
+            return cached['data']
+
+        headers = {}
+        if cached is not None and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+
+        response = self.request(f'movie/{tmdb_id}', headers=headers)
+        if response.status_code == 304 and cached is not None:
+            data = cached['data']
+        else:
+            data = response.json()
+
+        cache.set(cache_key, {
+            'fetched': time.time(),
+            'etag': response.headers.get('ETag', cached['etag'] if cached else None),
+            'data': data,
+        }, STALE_TIMEOUT)
+        return data
+
+    def conditional_movie(self, tmdb_id: int,
+                          etag: Optional[str] = None) -> tuple[Optional[dict[str, Any]], Optional[str]]:
+        """
+        Return details for a film and their ETag, bypassing the cache.
+
+        If `etag` is given and the film has not changed since, TMDB answers
+        304 without a body and None is returned in place of the details.
+        """
+        headers = {'If-None-Match': etag} if etag else {}
+        response = self.request(f'movie/{tmdb_id}', headers=headers)
+        if response.status_code == 304:
+            return None, response.headers.get('ETag', etag)
+        return response.json(), response.headers.get('ETag')
+
+    def search(self, query: str) -> list[dict[str, Any]]:
+        """Return the first page of film search results for a query."""
+        return self.get('search/movie', query=query)['results']
+
+    def image(self, path: str, size: str = 'original') -> bytes:
+        """Return the content of an image, e.g. a film's `poster_path`, at a TMDB size such as w500."""
+        return self._get(f'{self.image_endpoint}{size}/{path.lstrip("/")}').content
+
+
+_CLIENT: Optional[TMDBClient] = None
+
+
+def get_client() -> TMDBClient:
+    """Return the process-wide TMDB client, creating it from settings on first use."""
+    global _CLIENT  # pylint: disable=global-statement
+    if _CLIENT is None:
+        _CLIENT = TMDBClient(
+            settings.TMDB_ENDPOINT,
+            settings.TMDB_KEY,
+            timeout=settings.TMDB_TIMEOUT,
+            retries=settings.TMDB_RETRIES,
+            cache_ttl=settings.TMDB_CACHE_TTL,
+            image_endpoint=settings.TMDB_IMAGE_ENDPOINT,
+        )
+    return _CLIENT
+
+
+def set_client(client: Optional[TMDBClient]) -> None:
+    """Replace the process-wide TMDB client. Pass None to rebuild it from settings."""
+    global _CLIENT  # pylint: disable=global-statement
+    _CLIENT = client
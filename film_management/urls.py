@@ -6,7 +6,9 @@ app_name = 'film_management'
 
 urlpatterns = [
     path('submit_film/<int:tmdb_id>', views.submit_film),
+    path('submission_status/<int:job_id>', views.submission_status),
     path('submit_votes/', views.submit_votes),
+    path('tallies/', views.tallies),
     path('search_films/', views.search_films),
     path('delete_film/<str:tmdb_id>', views.delete_film),
     path('control_panel/', views.control_panel)
@@ -1,236 +1,380 @@
 """Views for film management."""
-import ast
 import datetime
-import random
-from typing import Optional, cast
-
-from django.contrib import messages
-from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.utils import IntegrityError, OperationalError
-from django.http import HttpResponseRedirect, JsonResponse
+import hashlib
+import json
+import os
+from typing import Any, Optional, cast
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db.utils import OperationalError
+from django.http import HttpResponseNotModified, HttpResponseRedirect, JsonResponse
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse
-from django.shortcuts import render
-import requests
-
-from core.models import User
-from philmnight.settings import TMDB_ENDPOINT, TMDB_KEY
-
-from .models import Film, FilmConfig
+from django.shortcuts import get_object_or_404, render
+from django.urls import get_script_prefix
+from django.templatetags.static import static
+from django.utils import timezone
+from django.utils.formats import date_format
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+from django.views.decorators.http import require_GET, require_POST
+from django.views.static import serve
+
+from core.models import Tenant, User
+from core.ratelimit import rate_limit
+from core.tenancy import tenant_admin_required
+
+from .images import DERIVATIVE_DIR
+from .models import Film, FilmConfig, Filmnight, Genre, SubmissionJob, Vote
+from .pagination import InvalidCursor, paginate
+from .search import find_films
+from .tally import VoteTally
+from .tmdb import TMDBError
+
+FILM_PAGE_SIZE = 50
+# Milliseconds between the vote page's checks for new tallies
+TALLY_POLL_INTERVAL = 2000
+# Cached fragments are keyed by the films version, so they only need to expire to free space
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+# Watchlist orderings, by query parameter and label
+FILM_SORTS = {
+    'name': 'Name',
+    '-date_submitted': 'Newest',
+    'date_submitted': 'Oldest',
+    '-score': 'Highest rated',
+    'score': 'Lowest rated',
+}
+# The only columns the watchlist needs
+FILM_LIST_FIELDS = ('tmdb_id', 'name', 'score', 'watched', 'poster_path', 'images_cached', 'date_submitted')
+
+
+# Each tenant's config and current filmnight, keyed by tenant id
+_CONFIGS: dict[int, tuple[str, FilmConfig]] = {}
+_FILMNIGHTS: dict[int, tuple[str, Optional[Filmnight], datetime.datetime]] = {}
+
+
+def get_config(tenant: Tenant) -> Optional[FilmConfig]:
+    """
+    Return a tenant's film config. If it doesn't exist, create it.
+
+    The config is kept in-process and only reloaded once its version in the
+    shared cache changes, so each call costs a cache lookup, not a query.
+    """
+    version = FilmConfig.cache_version(tenant.id)
+    cached_version, config = _CONFIGS.get(tenant.id, (None, None))
+    if config is not None and cached_version == version:
+        return config
 
-FILM_TIMEOUT = 10
-
-
-def get_config() -> Optional[FilmConfig]:
-    """Return the film config. If it doesn't exist, create it."""
     try:
-        return FilmConfig.objects.all()[0]
-    except IndexError:
-        return FilmConfig.objects.create(last_shortlist=datetime.datetime(1, 1, 1))
+        config = FilmConfig.objects.filter(tenant=tenant).first()
     except OperationalError as e:
         print('Error supressed to allow for migrations:\nError:'+str(e))
         return
+    if config is None:
+        return FilmConfig.objects.create(tenant=tenant)
+    _CONFIGS[tenant.id] = (version, config)
+    return config
 
 
-def reset_votes() -> None:
-    """Reset all votes for every film to 0."""
-    for user in User.objects.all():
-        user.current_votes = ''
-        user.save()
-
-
-@login_required
-def dashboard(request: HttpRequest) -> HttpResponse:
-    """View for dashboard - split in 2 at later date."""
-    film_config = get_config()
-    user: User = cast(User, request.user)
-    assert film_config is not None
-    phase = film_config.get_phase()
-
-    if phase == 'filmnight':
-        top_film = max([[film, film.votes] for film in Film.objects.all()], key=lambda x: x[1])[0]
-
-        return HttpResponseRedirect('/films/' + str(top_film.tmdb_id))
-
-    if phase == 'voting':
-        if (datetime.datetime.now() - film_config.last_shortlist).days > 7:
-            available_films = Film.objects.filter(watched=False)
-            film_config.shortlist.clear()
-            film_config.last_shortlist = datetime.datetime.now()
+def get_filmnight(tenant: Tenant) -> Optional[Filmnight]:
+    """
+    Return a tenant's filmnight in progress or coming up next, if any.
 
-            top_film = max([[film, film.votes] for film in Film.objects.all()],
-                           key=lambda x: x[1])[0]
-            top_film.watched = True
-            top_film.save()
+    Like the config, it is kept in-process until its version in the shared
+    cache changes, and also until its current phase ends, when a different
+    filmnight may have become current.
+    """
+    version = Filmnight.cache_version(tenant.id)
+    now = timezone.now()
+    cached_version, filmnight, expires = _FILMNIGHTS.get(tenant.id, (None, None, datetime.datetime.min))
+    if cached_version == version and now < expires:
+        return filmnight
 
-            reset_votes()
+    filmnight = Filmnight.objects.filter(tenant=tenant).select_related('winner').current(now)
+    expires = filmnight.schedule(now)[1] if filmnight is not None else datetime.datetime.max
+    _FILMNIGHTS[tenant.id] = (version, filmnight, expires)
+    return filmnight
 
-            for _ in range(film_config.shortlist_length):
-                try:
-                    chosen_film = random.choice(list(available_films))
-                except IndexError:
-                    break
 
-                film_config.shortlist.add(chosen_film)
-                available_films = available_films.exclude(id=chosen_film.id)
+def get_phase(filmnight: Optional[Filmnight]) -> FilmConfig.Phase:
+    """Return the phase of a filmnight; submissions are open while none is scheduled."""
+    return filmnight.get_phase() if filmnight is not None else FilmConfig.Phase.SUBMISSIONS
 
-            film_config.save()
 
-        current_votes = [str(i) for i in user.current_votes.split(',')]  # FIXME: Ditch Profile class to fix
-        if current_votes == ['']:
-            current_votes = []
+@login_required
+def dashboard(request: HttpRequest) -> HttpResponse:
+    """View for dashboard - split in 2 at later date."""
+    filmnight = get_filmnight(request.tenant)
+    user: User = cast(User, request.user)
+    phase = get_phase(filmnight)
+
+    if phase == FilmConfig.Phase.FILMNIGHT:
+        assert filmnight is not None
+        # Once voting has closed the recorded winner stands, even if the tally has been evicted or rebuilt since
+        if filmnight.closed:
+            top_film = filmnight.winner.tmdb_id if filmnight.winner is not None else None
+        else:
+            top_film = VoteTally(filmnight).leader()
+
+        if top_film is not None:
+            return HttpResponseRedirect(f'{get_script_prefix()}films/{top_film}')
+
+    if phase == FilmConfig.Phase.VOTING:
+        assert filmnight is not None
+        current_votes = [str(tmdb_id) for tmdb_id in Vote.objects.filter(
+            user=user, filmnight=filmnight
+        ).values_list('film__tmdb_id', flat=True)]
+
+        shortlisted_films = list(filmnight.shortlist.all())
+        vote_counts = VoteTally(filmnight).counts()
+        for shortlisted_film in shortlisted_films:
+            shortlisted_film.vote_count = vote_counts.get(shortlisted_film.tmdb_id, 0)
 
         context = {
-            'shortlisted_films': FilmConfig.objects.all()[0].shortlist.all(),
-            'current_votes': current_votes
+            'shortlisted_films': shortlisted_films,
+            'current_votes': current_votes,
+            'tally_poll_interval': TALLY_POLL_INTERVAL,
         }
 
         return render(request, 'film_management/vote.html', context)
     return render(request, 'film_management/submit.html')
 
 
+@require_POST
 @login_required
-def submit_film(request: HttpRequest, tmdb_id: str) -> HttpResponse:
-    """Submit the provided film ID to the filmnight database."""
-    try:
-        last_submission = Film.objects.filter(
-            submitting_user=request.user
-        ).order_by('-date_submitted')[0]
-        last_submit_delta = (datetime.datetime.now()-last_submission.date_submitted).seconds
-        if last_submit_delta < FILM_TIMEOUT:
-            messages.add_message(
-                request,
-                messages.ERROR,
-                f'You\'re doing that too fast. Try again in {FILM_TIMEOUT-last_submit_delta}'
-                ' seconds'
-            )
-            return HttpResponseRedirect('/dashboard/')
-    except IndexError:
-        pass
+@rate_limit('submit_film')
+def submit_film(request: HttpRequest, tmdb_id: int) -> HttpResponse:
+    """Queue the provided film ID to be added to the tenant's watchlist."""
+    job = SubmissionJob.objects.create(tenant=request.tenant, tmdb_id=tmdb_id, user=request.user)
+    return JsonResponse({'success': True, 'job': job.id})
 
-    try:
-        Film.objects.create(tmdb_id=tmdb_id, submitting_user=request.user)
-        messages.add_message(request, messages.SUCCESS, 'Successfully added film')
-    except IntegrityError:
-        messages.add_message(request, messages.ERROR, 'Film already exists in database.')
 
-    return HttpResponseRedirect('/dashboard/')
+@login_required
+def submission_status(request: HttpRequest, job_id: int) -> HttpResponse:
+    """Return the status of one of the user's queued film submissions."""
+    job = get_object_or_404(SubmissionJob, id=job_id, tenant=request.tenant, user=request.user)
+    return JsonResponse({'status': job.status, 'message': job.message, 'tmdb_id': job.tmdb_id})
 
 
 @login_required
 def film(request: HttpRequest, tmdb_id: str):
-    """Render information about a chosen film."""
-    chosen_film = Film.objects.get(tmdb_id=tmdb_id)
-    return render(request, 'film_management/film.html', {'film': chosen_film})
+    """Render information about a chosen film, only loading it if the page is not cached."""
+    return render(request, 'film_management/film.html', {
+        'film': SimpleLazyObject(lambda: get_object_or_404(Film, tenant=request.tenant, tmdb_id=tmdb_id)),
+        'tmdb_id': tmdb_id,
+        'films_version': Film.cache_version(request.tenant.id),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+    })
 
 
-@user_passes_test(lambda u: u.is_superuser)
+@tenant_admin_required
 def delete_film(request: HttpRequest, tmdb_id: str) -> HttpResponse:
-    """Delete a given film. Superusers only."""
-    chosen_film = Film.objects.get(tmdb_id=tmdb_id)
+    """Delete a given film. The tenant's admins only."""
+    chosen_film = Film.objects.get(tenant=request.tenant, tmdb_id=tmdb_id)
     chosen_film.delete()
-    return HttpResponseRedirect('/films/')
+    return HttpResponseRedirect(get_script_prefix() + 'films/')
 
 
-@login_required
-def submit_votes(request: HttpRequest) -> HttpResponse:
-    """Submit a vote on a film."""
-    config = get_config()
-    assert config is not None
+def parse_votes(body: bytes) -> tuple[Optional[set[int]], set[int], set[int]]:
+    """
+    Parse a vote submission into (full set, additions, removals) of TMDB ids.
 
-    if config.get_phase() != 'voting':
-        return JsonResponse({'success': False})
+    The body is JSON: either a list of every film voted for, or an object
+    with `add` and/or `remove` lists. Raises ValueError if it is malformed.
+    """
+    def ids(values: Any) -> set[int]:
+        if not isinstance(values, list):
+            raise ValueError('Votes must be lists of TMDB ids')
+        try:
+            return {int(tmdb_id) for tmdb_id in values}
+        except TypeError as e:
+            raise ValueError('TMDB ids must be numbers') from e
 
-    user: User = cast(User, request.user)
+    data = json.loads(body)
+    if isinstance(data, dict):
+        return None, ids(data.get('add', [])), ids(data.get('remove', []))
+    return ids(data), set(), set()
 
-    # Clear votes from previous weeks
-    if user.last_vote.isocalendar()[1] < datetime.datetime.now().isocalendar()[1]:
-        user.current_votes = ''
-        user.save()
+
+@require_POST
+@login_required
+@rate_limit('submit_votes')
+def submit_votes(request: HttpRequest) -> HttpResponse:
+    """
+    Update the user's votes and return the new tallies.
+
+    Films are checked against the cached shortlist, then removals and
+    additions are each written with one statement, while no other
+    submission of the same user can interleave with them.
+    """
+    filmnight = get_filmnight(request.tenant)
+    if filmnight is None or filmnight.get_phase() != FilmConfig.Phase.VOTING:
+        return JsonResponse({'success': False, 'message': 'Voting is not open'})
 
     try:
-        submitted_films: list = ast.literal_eval(request.body.decode('utf-8'))
+        chosen, added, removed = parse_votes(request.body)
     except ValueError:
-        return JsonResponse({'success': False})
+        return JsonResponse({'success': False, 'message': 'Invalid votes'})
 
-    old_votes = user.current_votes.split(',')
+    tally = VoteTally(filmnight)
+    shortlist = tally.shortlist()
+    if not (chosen or set()) | added | removed <= set(shortlist):
+        return JsonResponse({'success': False, 'message': 'Films must be on the shortlist'})
 
-    for current_film in submitted_films:
-        if current_film not in old_votes and current_film != '':
-            current_film = Film.objects.get(tmdb_id=current_film)
-            if current_film not in config.shortlist.all():
-                return JsonResponse({'success': False})
+    user: User = cast(User, request.user)
+    votes = Vote.objects.filter(user=user, filmnight=filmnight)
+    with tally.voting(user.pk):
+        previous = set(votes.values_list('film__tmdb_id', flat=True))
+        if chosen is not None:
+            added, removed = chosen - previous, previous - chosen
+        else:
+            added, removed = added - previous - removed, removed & previous
+
+        # A full set also removes votes for films since taken off the shortlist, which the tally never counted
+        if removed:
+            votes.filter(film__tmdb_id__in=removed).delete()
+        if added:
+            Vote.objects.bulk_create(
+                [Vote(user=user, film_id=shortlist[tmdb_id], filmnight=filmnight) for tmdb_id in added],
+                ignore_conflicts=True
+            )
+        tally.apply(added, removed & set(shortlist))
 
-    for current_film in old_votes:
-        if current_film not in submitted_films and current_film != '':
-            current_film = Film.objects.get(tmdb_id=current_film)
-            if current_film not in config.shortlist.all():
-                return JsonResponse({'success': False})
+    return JsonResponse({
+        'success': True,
+        'votes': sorted((previous | added) - removed),
+        'tallies': tally.counts(),
+    })
 
-    user.last_vote = datetime.datetime.now()
-    user.current_votes = ','.join(submitted_films)
-    user.save()
 
-    return JsonResponse({'success': True})
+@require_GET
+@login_required
+def tallies(request: HttpRequest) -> HttpResponse:
+    """
+    Return the vote tallies of the shortlist as JSON while voting is open.
+
+    The vote page polls this. Its ETag is the tally's sequence number in
+    the shared cache, so a poll that sends it back in If-None-Match gets an
+    empty 304, without the counts being read, until a vote changes them.
+    Every poll is a short request, so watching the tallies never holds a
+    worker. Responds 204 outside voting, which tells the page to stop.
+    """
+    filmnight = get_filmnight(request.tenant)
+    if filmnight is None or filmnight.get_phase() != FilmConfig.Phase.VOTING:
+        return HttpResponse(status=204)
+
+    tally = VoteTally(filmnight)
+    # Read before the counts, so a vote landing in between makes the next poll fetch them again
+    sequence = tally.sequence()
+    etag = f'"{sequence}"' if sequence is not None else None
+    if etag is not None and etag == request.headers.get('If-None-Match'):
+        response: HttpResponse = HttpResponseNotModified()
+    else:
+        response = JsonResponse(tally.counts())
+    if etag is not None:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 
 @login_required
 def films(request: HttpRequest) -> HttpResponse:
-    """Return a view of all submitted films."""
-    return render(request, 'film_management/films.html', {'films': Film.objects.order_by('name')})
+    """
+    Return a page of the watchlist, or the same page as JSON with format=json.
+
+    Films are sorted by `sort`, optionally filtered by `watched` (true or
+    false) and `submitter` (a user id), and paged with the opaque `cursor`
+    returned as `next`.
+    """
+    sort = request.GET.get('sort', 'name')
+    if sort not in FILM_SORTS:
+        sort = 'name'
+    filters = {'sort': sort}
+
+    watchlist = Film.objects.filter(tenant=request.tenant).only(*FILM_LIST_FIELDS).prefetch_related('genres')
+    if request.GET.get('watched') in ('true', 'false'):
+        filters['watched'] = request.GET['watched']
+        watchlist = watchlist.filter(watched=filters['watched'] == 'true')
+    if request.GET.get('submitter', '').isdigit():
+        filters['submitter'] = request.GET['submitter']
+        watchlist = watchlist.filter(submitting_user_id=int(filters['submitter']))
+
+    cursor = request.GET.get('cursor', '')
+    query = urlencode(dict(filters, cursor=cursor))
+
+    if request.GET.get('format') == 'json':
+        # Hashed, as memcached keys are limited to 250 characters and the cursor comes from the client
+        cache_key = f'films:json:{Film.cache_version(request.tenant.id)}:{hashlib.md5(query.encode()).hexdigest()}'
+        data = cache.get(cache_key)
+        if data is None:
+            try:
+                page, next_cursor = paginate(watchlist, sort, cursor, FILM_PAGE_SIZE)
+            except InvalidCursor:
+                return JsonResponse({'success': False})
+
+            placeholder = static('images/placeholder_film.png')
+            data = {'success': True, 'next': next_cursor, 'films': [{
+                'tmdb_id': listed_film.tmdb_id,
+                'name': listed_film.name,
+                'genres': [genre.name for genre in listed_film.genres.all()],
+                'date_submitted': date_format(listed_film.date_submitted, 'DATETIME_FORMAT'),
+                'score': listed_film.score,
+                'watched': listed_film.watched,
+                'poster': listed_film.poster_url() or placeholder,
+            } for listed_film in page]}
+            cache.set(cache_key, data, FRAGMENT_TIMEOUT)
+        return JsonResponse(data)
+
+    def load_page() -> dict[str, Any]:
+        try:
+            page, next_cursor = paginate(watchlist, sort, cursor, FILM_PAGE_SIZE)
+        except InvalidCursor:
+            page, next_cursor = paginate(watchlist, sort, None, FILM_PAGE_SIZE)
+        return {
+            'films': page,
+            'next': next_cursor and urlencode(dict(filters, cursor=next_cursor)),
+            'submitters': User.objects.filter(film__tenant=request.tenant).distinct().order_by(
+                'first_name', 'last_name'
+            ),
+        }
+
+    # The page is only loaded if the watchlist fragment is not cached
+    return render(request, 'film_management/films.html', {
+        'page': SimpleLazyObject(load_page),
+        'filters': filters,
+        'sorts': FILM_SORTS,
+        'query': query,
+        'films_version': Film.cache_version(request.tenant.id),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+    })
 
 
 @login_required
+@rate_limit('search_films')
 def search_films(request: HttpRequest) -> HttpResponse:
     """Search the TMDB database for a film."""
     current_string = request.body.decode('utf-8')
 
-    if current_string != '':
-        request_path = (TMDB_ENDPOINT + 'search/movie?query=' + current_string +
-                        '&api_key=' + TMDB_KEY)
-        response = requests.get(request_path).json()['results']
-        potential_films = []
-
-        while len(potential_films) < 5:
-            try:
-                current_film = response[len(potential_films)]
-            except IndexError:
-                break
-            if not Film.objects.filter(tmdb_id=current_film['id']).exists():
-                if current_film['release_date'] != '':
-                    time = datetime.datetime.strptime(current_film['release_date'], '%Y-%m-%d')
-                    if datetime.datetime.now() < time:
-                        potential_films.append(
-                            [current_film['title'] + ' (' +
-                             current_film['release_date'].split('-')[0] + ')', current_film['id'],
-                             True])
-                    else:
-                        potential_films.append(
-                            [current_film['title'] + ' (' +
-                             current_film['release_date'].split('-')[0] + ')', current_film['id'],
-                             False])
-                else:
-                    potential_films.append(
-                        [current_film['title'] + ' (' +
-                         current_film['release_date'].split('-')[0] + ')', current_film['id'],
-                         False])
-            else:
-                potential_films.append([
-                    current_film['title'] + ' (' +
-                    current_film['release_date'].split('-')[0] + ')', current_film['id'],
-                    True])
-
-        return JsonResponse({'films': potential_films})
+    if current_string.strip() != '':
+        try:
+            return JsonResponse({'films': find_films(current_string, request.tenant.id)})
+        except TMDBError:
+            pass
     return JsonResponse({'success': False})
 
 
-@user_passes_test(lambda u: u.is_superuser)
+@tenant_admin_required
 def control_panel(request: HttpRequest):
     """Unimplemented filmnight control panel."""
-    genres = []
-    for current_film in Film.objects.all():
-        for genre in current_film.genres:
-            if genre not in genres and genre.strip() != '':
-                genres.append(genre)
-    context = {'genres': genres}
+    context = {'genres': Genre.objects.filter(films__tenant=request.tenant).distinct()}
     return render(request, 'film_management/control_panel.html', context)
+
+
+@require_GET
+def derivative(request: HttpRequest, name: str) -> HttpResponse:
+    """Serve a rendered image in development. Its name contains the source's hash, so it never changes."""
+    response = serve(request, name, document_root=os.path.join(settings.MEDIA_ROOT, DERIVATIVE_DIR))
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
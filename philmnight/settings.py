@@ -11,6 +11,10 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 
@@ -30,6 +34,10 @@ SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET = os.environ['GOOGLE_OAUTH_SECRET']
 
 TMDB_ENDPOINT = os.environ['TMDB_ENDPOINT']
 TMDB_KEY = os.environ['TMDB_KEY']
+TMDB_TIMEOUT = float(os.environ.get('TMDB_TIMEOUT', '5'))
+TMDB_RETRIES = int(os.environ.get('TMDB_RETRIES', '3'))
+TMDB_CACHE_TTL = int(os.environ.get('TMDB_CACHE_TTL', '3600'))
+TMDB_IMAGE_ENDPOINT = os.environ.get('TMDB_IMAGE_ENDPOINT', 'https://image.tmdb.org/t/p/')
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.environ['DEBUG'] == 'True'
@@ -56,7 +64,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.tenancy.TenantMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,11 +75,28 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Slug of the tenant serving requests whose host and path match no other tenant; leave empty to
+# answer them with 404. Tenants are otherwise chosen by their domain, then by a /<slug>/ path prefix.
+DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+
+# Requests each user may make to rate-limited views, as count/seconds
+RATE_LIMITS = {
+    'submit_film': os.environ.get('RATE_LIMIT_SUBMIT_FILM', '1/10'),
+    'search_films': os.environ.get('RATE_LIMIT_SEARCH_FILMS', '120/60'),
+    'submit_votes': os.environ.get('RATE_LIMIT_SUBMIT_VOTES', '30/60'),
+}
+
+# Requests slower than this many seconds are logged with their SQL, TMDB and template times
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', '1'))
+# Each worker adds its request metrics to the shared cache at most this often, in seconds
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '10'))
+
 ROOT_URLCONF = 'philmnight.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Times rendering for core.metrics
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': ['./templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,6 +105,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.tenancy.tenant',
             ],
         },
     },
@@ -89,13 +117,70 @@ WSGI_APPLICATION = 'philmnight.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
+# Set DATABASE_ENGINE=postgresql and the DATABASE_* variables below to use PostgreSQL (through psycopg2).
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and reused between requests.
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', '60'))
+
+if os.environ.get('DATABASE_ENGINE', 'sqlite3') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['DATABASE_NAME'],
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', ''),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            # Seconds a write waits for another connection's lock before failing with "database is locked"
+            'OPTIONS': {'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20'))},
+            # Tests that run concurrent workers need a file database so they wait on each other's locks.
+            # It is kept out of the checkout.
+            'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'philmnight_test_db.sqlite3')},
+        }
+    }
+
+# Pragmas set on each new SQLite connection by core.signals. WAL lets requests keep reading
+# while votes are written, and NORMAL sync is durable in WAL mode apart from power loss.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # Negative sizes are in KiB
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', '-20000')),
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Vote tallies and locks, rate limits, version tokens and metrics are shared through the cache
+# by every web worker and by run_scheduler, so it must be one backend they all reach, with
+# atomic incr. Memcached is the default; a per-process local memory cache is only allowed
+# while developing or testing.
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+# Whether the test runner or pytest is running
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': os.environ.get('CACHE_BACKEND', LOCMEM_CACHE if TESTING
+                                  else 'django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', '' if TESTING else '127.0.0.1:11211'),
     }
 }
 
+if CACHES['default']['BACKEND'] == LOCMEM_CACHE and not (DEBUG or TESTING):
+    raise ImproperlyConfigured('CACHE_BACKEND must be shared by every worker and run_scheduler, e.g. memcached')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -159,6 +244,8 @@ AUTH_USER_MODEL = 'core.User'
 
 # Media
 
+# Outside DEBUG, the web server serves MEDIA_ROOT at MEDIA_URL. Files under derivatives/ are named by the hash
+# of their source, so serve them with "Cache-Control: public, max-age=31536000, immutable".
 MEDIA_URL = '/media/'
 
 if not DEBUG:
@@ -33,4 +33,5 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
+    urlpatterns += [path(settings.MEDIA_URL.lstrip('/') + 'derivatives/<str:name>', fm_views.derivative)]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)